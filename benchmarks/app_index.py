@@ -0,0 +1,56 @@
+"""
+Benchmark the name search over a generated app list of realistic size.
+
+Usage: pdm run python benchmarks/app_index.py [--apps 200000]
+"""
+
+import random
+import string
+import time
+import timeit
+from argparse import ArgumentParser
+
+from steam_details.app_index import AppIndex
+
+QUERIES = [
+    "Portal 2",  # Exact (two apps share the name)
+    "portal2",  # Missing space
+    "Cyberpunk 2078",  # Typo
+    "cyberpnk",  # Missing letter
+    "witcher 3",  # Missing subtitle
+    "half",  # Prefix
+    "zzzzzzz"  # No match
+]
+
+
+def make_apps(app_count: int) -> list[tuple[int, str]]:
+    """Return random app names of 1-5 words and a few well-known ones."""
+    rng = random.Random(0)  # noqa: S311
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20000)]
+    words += ["the", "of", "edition", "soundtrack", "dlc", "pack", "simulator", "2", "ii"]
+    apps = [(appid, " ".join(rng.choice(words).capitalize() for _ in range(rng.randint(1, 5)))) for appid in range(10, app_count)]
+    apps += [(400, "Portal 2"), (620, "Portal 2"), (70, "Half-Life"), (220, "Half-Life 2"), (1091500, "Cyberpunk 2077"), (292030, "The Witcher® 3: Wild Hunt")]
+    return apps
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("--apps", type=int, default=200000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    apps = make_apps(args.apps)
+    start_time = time.perf_counter()
+    app_index = AppIndex(apps)
+    print(f"Built index of {len(app_index)} names in {time.perf_counter() - start_time:.2f}s")
+
+    for query in QUERIES:
+        seconds = timeit.timeit(lambda query=query: app_index.search(query, limit=10), number=args.number)
+        candidates = app_index.search(query, limit=2)
+        best = ", ".join(f"{candidate.name} ({candidate.appid}, {candidate.score})" for candidate in candidates)
+        print(f"{query!r:<18} {seconds / args.number * 1e3:6.3f}ms  {best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark the latency of light requests while SteamDB pages are parsed on the event loop, in threads and in worker processes.
+
+Usage: pdm run python benchmarks/cpu_pool.py [--pages 40] [--rows 2000]
+"""
+
+import asyncio
+import statistics
+import time
+from argparse import ArgumentParser
+from collections.abc import Awaitable, Callable
+
+from steam_details.cpu_pool import CPUPool
+from steam_details.services.steamdb import find_historical_low
+
+
+def make_page(rows: int) -> str:
+    """Return a page like the one of SteamDB with a large table before the price table."""
+    filler = "".join(f"<tr><td>{i}</td><td>Depot {i}</td><td><a href='/depot/{i}/'>{i * 7}</a></td></tr>" for i in range(rows))
+    return (
+        "<html><body>"
+        f"<table><thead><tr><th>ID</th><th>Name</th><th>Size</th></tr></thead><tbody>{filler}</tbody></table>"
+        "<table><thead><tr><th>Currency</th><th>Current Price</th><th>Converted Price</th><th>Lowest Recorded Price</th></tr></thead><tbody>"
+        "<tr><td>Euro</td><td>19,99€</td><td>19,99€</td><td>-</td><td class='muted' title='27 November 2024'>9,99€ at -50%</td></tr>"
+        "</tbody></table></body></html>"
+    )
+
+
+async def run(parse: Callable[[str], Awaitable[tuple[str, str] | None]], page: str, pages: int) -> list[float]:
+    """Parse the pages concurrently and return the latencies of light requests that run meanwhile."""
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def light_requests() -> None:
+        while not done.is_set():
+            start_time = time.perf_counter()
+            await asyncio.sleep(0.005)
+            latencies.append(time.perf_counter() - start_time - 0.005)
+
+    async def parse_pages() -> None:
+        await asyncio.gather(*(parse(page) for _ in range(pages)))
+        done.set()
+
+    await asyncio.gather(light_requests(), parse_pages())
+    return latencies
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = make_page(args.rows)
+    start_time = time.perf_counter()
+    assert find_historical_low(page) == ("9,99€ at -50%", "27 November 2024")  # noqa: S101
+    print(f"{len(page) / 1024:.0f} KiB page, parsed in {(time.perf_counter() - start_time) * 1e3:.0f}ms")
+
+    async def inline(page: str) -> tuple[str, str] | None:
+        await asyncio.sleep(0)
+        return find_historical_low(page)
+
+    thread_pool = CPUPool(0)
+    process_pool = CPUPool(4)
+
+    async def warm_up() -> None:
+        await asyncio.gather(*(process_pool.run(find_historical_low, page) for _ in range(4)))
+    asyncio.run(warm_up())
+
+    for label, parse in (
+        ("event loop", inline),
+        ("threads", lambda page: thread_pool.run(find_historical_low, page)),
+        ("processes", lambda page: process_pool.run(find_historical_low, page))
+    ):
+        start_time = time.perf_counter()
+        latencies = asyncio.run(run(parse, page, args.pages))
+        total = time.perf_counter() - start_time
+        p99 = statistics.quantiles(latencies, n=100)[-1] * 1e3 if len(latencies) > 1 else latencies[0] * 1e3
+        print(f"{label:<10} {args.pages} pages in {total:6.2f}s  light request p99 {p99:8.2f}ms  max {max(latencies) * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
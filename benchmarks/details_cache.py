@@ -0,0 +1,112 @@
+"""
+Benchmark the memory used by the details cache of the memory backend.
+
+The old representation (a tuple of the expiry time and the record per game) is rebuilt here to compare it with the current one.
+
+Usage: pdm run python benchmarks/details_cache.py [--games 10000]
+"""
+
+import asyncio
+import random
+import string
+import timeit
+import tracemalloc
+from argparse import ArgumentParser
+from collections.abc import Callable
+
+from steam_details.backend import DetailsRecord, MemoryBackend
+from steam_details.details import CachedDetails
+
+CDN_PREFIX = "https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/"
+
+
+def make_services(appid: int, rng: random.Random) -> dict:
+    """Return services like the ones of a released game with a header and screenshots."""
+    timestamp = rng.randint(1600000000, 1730000000)
+    screenshots = [
+        f"{CDN_PREFIX}{appid}/ss_{''.join(rng.choices('0123456789abcdef', k=40))}.600x338.jpg?t={timestamp}"
+        for _ in range(rng.randint(5, 20))
+    ]
+    name = " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).capitalize() for _ in range(rng.randint(1, 4)))
+    return {
+        "steam": {"success": True, "data": {
+            "appid": appid,
+            "name": name,
+            "images": [f"{CDN_PREFIX}{appid}/header.jpg?t={timestamp}", *screenshots],
+            "external_url": f"https://store.steampowered.com/app/{appid}/",
+            "released": True,
+            "price": round(rng.uniform(1, 60), 2),
+            "discount": rng.choice([0, 0, 25, 50, 75]),
+            "release_date": {"display_string": "6 Jun, 2024", "iso_date": "2024-06-06"},
+            "overall_reviews": {"desc": "Very Positive", "score": 8, "total_reviews": rng.randint(10, 100000)},
+            "achievement_count": rng.randint(0, 100),
+            "native_linux_support": rng.random() < 0.2
+        }},
+        "steam_historical_low": {"success": True, "data": {
+            "price": round(rng.uniform(1, 30), 2), "discount": 50, "iso_date": "2024-11-27", "external_url": f"https://steamdb.info/app/{appid}/"
+        }},
+        "key_and_gift_sellers": {"success": True, "data": None},
+        "game_length": {"success": True, "data": {
+            "main": rng.randint(3600, 100000), "plus": None, "completionist": None, "external_url": f"https://howlongtobeat.com/game/{appid * 7}"
+        }},
+        "linux_support": {"success": True, "data": {
+            "tier": "GOLD", "confidence": "strong", "report_count": rng.randint(1, 500), "external_url": f"https://www.protondb.com/app/{appid}"
+        }}
+    }
+
+
+def measure(store: Callable[[], None]) -> int:
+    """Return the bytes allocated by the store function."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("--games", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)  # noqa: S311
+    services = {appid: make_services(appid, rng) for appid in range(10, 10 + args.games * 10, 10)}
+    records = {appid: CachedDetails(game_services).record() for appid, game_services in services.items()}
+    body_size = sum(len(record.body) for record in records.values()) / len(records)
+    print(f"{len(records)} games, {body_size:.0f} bytes of JSON per game")
+
+    # Old: appid -> (expiry time, record), the records are rendered again so they are measured as well
+    old_details: dict[int, tuple[float, DetailsRecord]] = {}
+
+    def store_old() -> None:
+        for appid, game_services in services.items():
+            record = CachedDetails(game_services).record()
+            old_details[appid] = (record.cache_time + 900, record)
+
+    backend = MemoryBackend()
+
+    def store_new() -> None:
+        async def store() -> None:
+            for appid, game_services in services.items():
+                await backend.set_details(appid, CachedDetails(game_services).record(), 900)
+        asyncio.run(store())
+
+    old_size = measure(store_old)
+    new_size = measure(store_new)
+    print(f"old     {old_size / len(records):8.0f} bytes per game")
+    print(f"compact {new_size / len(records):8.0f} bytes per game ({new_size / old_size:.0%})")
+
+    # Reading expands the body again
+    async def check() -> None:
+        for appid, record in records.items():
+            assert (await backend.get_details(appid))[1:] == record[1:]  # noqa: S101
+    asyncio.run(check())
+    appid = next(iter(records))
+    seconds = timeit.timeit(lambda: backend._details[appid].record(appid), number=10000) / 10000
+    print(f"get_details expands a body in {seconds * 1e6:.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
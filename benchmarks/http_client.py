@@ -0,0 +1,147 @@
+"""
+Benchmark the upstream HTTP client against local stand-in servers.
+
+Every stand-in host delays the first request on a new connection by a simulated
+TCP + TLS handshake and every response by a simulated upstream latency.
+The untuned client (the old `httpx.AsyncClient(timeout=15)`) is compared with the
+per-host pools from `steam_details.utils` with prewarmed connections.
+
+Usage: pdm run python benchmarks/http_client.py [--games 40] [--concurrency 8]
+"""
+
+import asyncio
+import statistics
+import time
+from argparse import ArgumentParser
+
+import httpx
+
+from steam_details.utils import (
+    UPSTREAMS,
+    UpstreamConfig,
+    create_http_client,
+    prewarm_connections,
+)
+
+# Requests made by one game lookup: (upstream, count), roughly like the real services
+LOOKUP_REQUESTS = [
+    ("store.steampowered.com", 2),  # appdetails + appreviews
+    ("www.protondb.com", 1),
+    ("howlongtobeat.com", 1),
+    ("www.keyforsteam.de", 2),  # game page + offers
+    ("www.allkeyshop.com", 1)  # price history
+]
+
+
+class StandInServer:
+    def __init__(self, handshake_delay: float, response_delay: float) -> None:
+        self.handshake_delay = handshake_delay
+        self.response_delay = response_delay
+        self.connection_count = 0
+        self.port: int | None = None
+        self._server: asyncio.Server | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connection_count += 1
+        await asyncio.sleep(self.handshake_delay)
+        try:
+            while True:
+                request_head = await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(self.response_delay)
+                body = b"" if request_head.startswith(b"HEAD") else b"{}"
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        """Start listening on a free local port."""
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        self._server.close()
+
+
+async def lookup(client: httpx.AsyncClient, hosts: dict[str, str], latencies: list[float]) -> None:
+    """Make the requests of one game lookup concurrently, like the services do."""
+    async def request(url: str) -> None:
+        start_time = time.perf_counter()
+        r = await client.get(url)
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - start_time)
+
+    await asyncio.gather(*(
+        request(f"http://{hosts[upstream]}/")
+        for upstream, count in LOOKUP_REQUESTS
+        for _ in range(count)
+    ))
+
+
+async def run(name: str, client: httpx.AsyncClient, hosts: dict[str, str], servers: list[StandInServer], games: int, concurrency: int, gap: float) -> None:
+    """Look up some games with the given client and print the stats."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    connections_before = sum(server.connection_count for server in servers)
+
+    async def game() -> None:
+        async with semaphore:
+            await lookup(client, hosts, latencies)
+            await asyncio.sleep(gap)  # Like the frontend waiting between wishlist entries
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(game() for _ in range(games)))
+    total_time = time.perf_counter() - start_time
+
+    latencies.sort()
+    print(
+        f"{name:<10} total {total_time:6.2f}s  "
+        f"mean {statistics.mean(latencies) * 1000:6.1f}ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f}ms  "
+        f"new connections during load {sum(server.connection_count for server in servers) - connections_before}"
+    )
+
+
+async def main() -> None:
+    """Run the benchmark for the untuned and the tuned client."""
+    parser = ArgumentParser()
+    parser.add_argument("--games", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--gap", type=float, default=0.0, help="Seconds to wait after every game (try 6 to exceed the default keep-alive expiry)")
+    parser.add_argument("--handshake-ms", type=float, default=80)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    for name in ("untuned", "tuned"):
+        # Fresh stand-in servers for every run
+        servers: dict[str, StandInServer] = {}
+        for upstream, _ in LOOKUP_REQUESTS:
+            servers[upstream] = StandInServer(args.handshake_ms / 1000, args.latency_ms / 1000)
+            await servers[upstream].start()
+        hosts = {upstream: f"127.0.0.1:{server.port}" for upstream, server in servers.items()}
+
+        if name == "untuned":
+            client = httpx.AsyncClient(timeout=15)
+        else:
+            # Same limits as the real upstreams, but plain HTTP/1.1 because the stand-in has no TLS
+            upstreams: dict[str, UpstreamConfig] = {
+                hosts[upstream]: {**UPSTREAMS[upstream], "http2": False}
+                for upstream in servers
+            }
+            client = create_http_client(upstreams, scheme="http")
+            await prewarm_connections(client, upstreams, scheme="http")
+
+        await run(name, client, hosts, list(servers.values()), args.games, args.concurrency, args.gap)
+
+        await client.aclose()
+        for server in servers.values():
+            await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
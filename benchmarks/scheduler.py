@@ -0,0 +1,60 @@
+"""
+Benchmark the wait time of interactive calls while a large batch is running on the same service.
+
+Usage: pdm run python benchmarks/scheduler.py [--batch 500] [--slots 4]
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from argparse import ArgumentParser
+
+from steam_details.scheduler import Priority, PriorityScheduler
+
+
+async def call(scheduler: PriorityScheduler, priority: Priority, waits: list[float], rng: random.Random) -> None:
+    """Wait for a slot and simulate an upstream request."""
+    start_time = time.perf_counter()
+    async with scheduler.slot(priority):
+        waits.append(time.perf_counter() - start_time)
+        await asyncio.sleep(rng.uniform(0.005, 0.02))
+
+
+async def run(batch_size: int, slots: int, interactive_count: int, use_priorities: bool) -> tuple[list[float], list[float]]:
+    """Start the batch and interactive calls while it runs, and return the wait times of both."""
+    rng = random.Random(0)  # noqa: S311
+    scheduler = PriorityScheduler(slots, reserved_slots=1 if use_priorities and slots > 1 else 0)
+    batch_priority = Priority.BATCH if use_priorities else Priority.INTERACTIVE
+    batch_waits: list[float] = []
+    interactive_waits: list[float] = []
+
+    tasks = [asyncio.create_task(call(scheduler, batch_priority, batch_waits, rng)) for _ in range(batch_size)]
+    for _ in range(interactive_count):
+        await asyncio.sleep(0.02)
+        tasks.append(asyncio.create_task(call(scheduler, Priority.INTERACTIVE, interactive_waits, rng)))
+    await asyncio.gather(*tasks)
+    return interactive_waits, batch_waits
+
+
+def p95(values: list[float]) -> float:
+    """Return the 95th percentile in milliseconds."""
+    return statistics.quantiles(values, n=20)[-1] * 1e3
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = ArgumentParser()
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--interactive", type=int, default=40)
+    args = parser.parse_args()
+
+    for use_priorities in (False, True):
+        interactive_waits, batch_waits = asyncio.run(run(args.batch, args.slots, args.interactive, use_priorities))
+        label = "priorities" if use_priorities else "first come"
+        print(f"{label:<11} interactive p95 {p95(interactive_waits):8.2f}ms  batch p95 {p95(batch_waits):8.2f}ms  batch max {max(batch_waits) * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark the details serialization and the KeyForSteam offer evaluation.
+
+The old code paths (pydantic models that are dumped again and again) are
+rebuilt here to compare them with the current ones.
+
+Usage: pdm run python benchmarks/serialization.py [--offers 300]
+"""
+
+import json
+import random
+import timeit
+from argparse import ArgumentParser
+from typing import Any
+
+from pydantic import BaseModel
+
+from steam_details.details import (
+    CachedDetails,
+    ServiceDetails,
+    ServiceError,
+    ServicePending,
+    render_details,
+)
+from steam_details.services.keyforsteam import KeyForSteam
+
+
+class OldDetails(BaseModel):
+    services: dict[str, ServiceDetails | ServicePending | ServiceError]
+    from_cache: bool
+
+
+class OldOffer(BaseModel):
+    id: int
+    is_available: bool
+
+    price: float
+    form: str
+    seller: str
+    edition: str
+
+
+def old_evaluate_offers(offers_data: dict) -> tuple[OldOffer | None, OldOffer | None]:
+    """Evaluate the offers like before: one pydantic model per offer."""
+    steam_offer = None
+    cheapest_offer = None
+    for offer_data in offers_data["offers"]:
+        offer = OldOffer(
+            id=offer_data["id"],
+            is_available=offer_data["isActive"] and offer_data["stock"] == "InStock",
+
+            price=round(offer_data["price"]["eur"]["priceCard"], 2),
+            form=offers_data["regions"][offer_data["region"]]["name"],
+            seller=offers_data["merchants"][str(offer_data["merchant"])]["name"],
+            edition=offers_data["editions"][offer_data["edition"]]["name"]
+        )
+        if offer.seller == "Steam":
+            steam_offer = offer
+        elif all((
+            offer.is_available,
+            "ACCOUNT" not in offer.form,
+            "ONLY" not in offer.form,
+            "AUF" not in offer.form,
+            cheapest_offer is None or offer.price < cheapest_offer.price
+        )):
+            cheapest_offer = offer
+    return steam_offer, cheapest_offer
+
+
+def make_services(screenshot_count: int = 20) -> dict[str, Any]:
+    """Return services like a released game with every service loaded."""
+    return {
+        "steam": {"success": True, "data": {
+            "appid": 1245620,
+            "name": "ELDEN RING",
+            "images": [f"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/1245620/ss_{i:040x}.600x338.jpg" for i in range(screenshot_count)],
+            "external_url": "https://store.steampowered.com/app/1245620/",
+            "released": True,
+            "price": 59.99,
+            "discount": 0,
+            "release_date": {"display_string": "24 Feb, 2022", "iso_date": "2022-02-24"},
+            "overall_reviews": {"desc": "Very Positive", "score": 93, "total_reviews": 700000},
+            "achievement_count": 42,
+            "native_linux_support": False
+        }},
+        "steam_historical_low": {"success": True, "data": {"price": 29.99, "discount": 50, "iso_date": "2024-06-27", "external_url": "https://steamdb.info/app/1245620/"}},
+        "key_and_gift_sellers": {"success": True, "data": {
+            "cheapest_offer": {"price": 31.5, "form": "STEAM KEY", "seller": "Seller", "edition": "Standard"},
+            "historical_low": {"price": 25.0, "seller": "Seller", "iso_date": "2024-06-27T00:00:00"},
+            "id_verified": True,
+            "external_url": "https://www.keyforsteam.de/elden-ring-key-kaufen-preisvergleich/"
+        }},
+        "game_length": {"success": True, "data": {"main": 200000, "plus": 350000, "completionist": 480000, "external_url": "https://howlongtobeat.com/game/68151"}},
+        "linux_support": {"success": True, "data": {"tier": "GOLD", "confidence": "strong", "report_count": 900, "external_url": "https://www.protondb.com/app/1245620"}}
+    }
+
+
+def make_offers_data(offer_count: int) -> dict:
+    """Return a get_offers response with the given number of offers."""
+    rng = random.Random(0)  # noqa: S311
+    return {
+        "success": True,
+        "regions": {f"r{i}": {"name": name} for i, name in enumerate(["STEAM KEY", "STEAM ACCOUNT", "EU STEAM KEY", "STEAM GIFT"])},
+        "merchants": {str(i): {"name": "Steam" if i == 0 else f"Seller {i}"} for i in range(50)},
+        "editions": {"1": {"name": "Standard"}, "2": {"name": "Deluxe"}},
+        "offers": [
+            {
+                "id": i,
+                "isActive": rng.random() > 0.1,
+                "stock": "InStock" if rng.random() > 0.1 else "OutOfStock",
+                "price": {"eur": {"priceCard": rng.uniform(5, 60)}},
+                "region": f"r{rng.randrange(4)}",
+                "merchant": rng.randrange(50),
+                "edition": rng.choice(["1", "2"])
+            }
+            for i in range(offer_count)
+        ]
+    }
+
+
+def report(name: str, old: float, new: float, number: int) -> None:
+    """Print the time per call and the speedup."""
+    print(f"{name:<28} old {old / number * 1e6:9.1f}µs  new {new / number * 1e6:9.1f}µs  speedup {old / new:6.1f}x")
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = ArgumentParser()
+    parser.add_argument("--offers", type=int, default=300)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    services = make_services()
+    cached_details = CachedDetails(make_services())
+
+    # Cache hit: rebuild the model and dump it vs. return the stored bytes
+    old = timeit.timeit(lambda: json.dumps(OldDetails(services=services, from_cache=True).model_dump()), number=args.number)
+    new = timeit.timeit(lambda: cached_details.body, number=args.number)
+    report("cache hit", old, new, args.number)
+
+    # Cache miss: dump the model of every service, wrap and dump again vs. serialize once
+    old = timeit.timeit(lambda: json.dumps(OldDetails(services=services, from_cache=False).model_dump()), number=args.number)
+    new = timeit.timeit(lambda: render_details(CachedDetails(services).services_json, [], from_cache=False), number=args.number)
+    report("cache miss", old, new, args.number)
+
+    # Offers
+    keyforsteam = KeyForSteam("KeyForSteam", "keyforsteam")
+    offers_data = make_offers_data(args.offers)
+    number = max(args.number // 10, 1)
+    old = timeit.timeit(lambda: old_evaluate_offers(offers_data), number=number)
+    new = timeit.timeit(lambda: keyforsteam._evaluate_offers(offers_data), number=number)
+    report(f"evaluate {args.offers} offers", old, new, number)
+
+
+if __name__ == "__main__":
+    main()
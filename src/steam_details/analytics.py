@@ -10,6 +10,7 @@ import pandas as pd
 import seaborn as sns
 from pydantic import BaseModel
 
+from .loop_monitor import LoopLag
 from .utils import ANSICodes
 
 
@@ -18,11 +19,19 @@ class AnalyticsService(TypedDict):
     load_time: float | None
     timeout_count: int
     error_count: int
+    request_budget: int | None  # Upstream requests per lookup, None for no limit
+    requests_per_lookup: float | None  # Average of all lookups, None without lookups
+    budget_exhausted_count: int
+    tier_counts: dict[str, int]  # Tier -> lookups it served
+    max_concurrency: int
+    running: int  # Calls of this worker
+    waiting: dict[str, int]  # Priority -> calls of this worker waiting for a slot
 
 
 class Analytics(BaseModel):
     services: list[AnalyticsService]
     speed_box_plot: str | None  # base64 encoded png
+    loop_lag: LoopLag  # Of this worker
 
 
 sns.set_theme(
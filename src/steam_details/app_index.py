@@ -0,0 +1,139 @@
+import bisect
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import NamedTuple
+
+FUZZY_MATCH_MIN_SCORE = 0.65  # Names are only resolved to fuzzy candidates that are at least this similar
+MAX_PREFIX_MATCHES = 200  # Prefix matches that are ranked (short queries match a lot of names)
+MAX_FUZZY_CANDIDATES = 50  # Fuzzy candidates that are ranked by their similarity
+MAX_COUNTED_POSTINGS = 4000  # Names counted per query, the rarest trigrams are counted first
+
+_IGNORED_CHARACTERS = re.compile(r"[™®©]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+class Candidate(NamedTuple):
+    appid: int
+    name: str
+    score: float  # 1.0 for an exact match of the normalized name
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase the name without accents, trademark symbols and punctuation."""
+    name = unicodedata.normalize("NFKD", _IGNORED_CHARACTERS.sub("", name))
+    name = "".join(character for character in name if not unicodedata.combining(character))
+    return _SEPARATORS.sub(" ", name.lower()).strip()
+
+
+def get_trigrams(normalized_name: str) -> set[str]:
+    """Return the trigrams of the name padded with spaces, so short words and word starts count as well."""
+    padded = f"  {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AppIndex:
+    """
+    Exact, prefix and fuzzy (trigram) search over the steam app list.
+
+    Apps are grouped by their normalized name, so apps with the same name keep all their app ids.
+    """
+
+    def __init__(self, apps: list[tuple[int, str]]) -> None:
+        self._exact: dict[str, list[int]] = {}  # Lowercase name -> app ids
+        apps_by_key: dict[str, list[tuple[int, str]]] = {}
+        for appid, name in apps:
+            self._exact.setdefault(name.lower(), []).append(appid)
+            key = normalize_name(name)
+            if key:
+                apps_by_key.setdefault(key, []).append((appid, name))
+
+        # Sorted normalized names for prefix searches
+        self._keys = sorted(apps_by_key)
+        self._apps = [apps_by_key[key] for key in self._keys]
+        self._key_indices = {key: index for index, key in enumerate(self._keys)}
+
+        # Trigram -> indices of the normalized names for fuzzy searches
+        postings: dict[str, list[int]] = {}
+        for index, key in enumerate(self._keys):
+            for trigram in get_trigrams(key):
+                postings.setdefault(trigram, []).append(index)
+        self._postings = {trigram: array("I", indices) for trigram, indices in postings.items()}
+
+    def __len__(self) -> int:
+        """Return the number of distinct normalized names."""
+        return len(self._keys)
+
+    def find(self, name: str) -> list[int]:
+        """Return the app ids with exactly this name (ignoring case, accents, trademark symbols and punctuation)."""
+        appids = self._exact.get(name.lower())
+        if appids is not None:
+            return appids
+        index = self._key_indices.get(normalize_name(name))
+        if index is None:
+            return []
+        return [appid for appid, _ in self._apps[index]]
+
+    def _prefix_scores(self, query: str) -> dict[int, float]:
+        scores: dict[int, float] = {}
+        start = bisect.bisect_left(self._keys, query)
+        for index in range(start, min(start + MAX_PREFIX_MATCHES, len(self._keys))):
+            key = self._keys[index]
+            if not key.startswith(query):
+                break
+            scores[index] = 1.0 if key == query else 0.8 + 0.15 * len(query) / len(key)
+        return scores
+
+    def _fuzzy_scores(self, query: str) -> dict[int, float]:
+        trigrams = get_trigrams(query)
+        postings = sorted(
+            (self._postings[trigram] for trigram in trigrams if trigram in self._postings),
+            key=len
+        )
+        if not postings:
+            return {}
+
+        # Find candidates with the rarest trigrams, they are the most selective (a typo only changes up to three of them)
+        counter: Counter[int] = Counter()
+        counted = 0
+        for indices in postings:
+            if counted and counted + len(indices) > MAX_COUNTED_POSTINGS:
+                break
+            counter.update(indices)
+            counted += len(indices)
+
+        # Rank the candidates by their similarity (Sørensen-Dice coefficient) and how much of the query they contain (missing subtitles)
+        scores: dict[int, float] = {}
+        for index, _ in counter.most_common(MAX_FUZZY_CANDIDATES):
+            key_trigrams = get_trigrams(self._keys[index])
+            common = len(trigrams & key_trigrams)
+            scores[index] = (2 * common / (len(trigrams) + len(key_trigrams)) + common / len(trigrams)) / 2
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> list[Candidate]:
+        """Return the best matching apps for the query, best first."""
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        scores = self._fuzzy_scores(query)
+        for index, score in self._prefix_scores(query).items():
+            scores[index] = max(score, scores.get(index, 0.0))
+
+        candidates: list[Candidate] = []
+        for index in sorted(scores, key=lambda index: (-scores[index], len(self._keys[index]), index)):
+            for appid, name in sorted(self._apps[index]):
+                candidates.append(Candidate(appid, name, round(scores[index], 3)))
+            if len(candidates) >= limit:
+                break
+        return candidates[:limit]
+
+    def resolve(self, name: str) -> int | None:
+        """Return the app id for the name, falling back to the most similar name if there is no exact match."""
+        appids = self.find(name)
+        if appids:
+            return min(appids)  # Usually the original app if multiple apps share the name
+        candidates = self.search(name, limit=1)
+        if candidates and candidates[0].score >= FUZZY_MATCH_MIN_SCORE:
+            return candidates[0].appid
@@ -0,0 +1,571 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from .utils import ANSICodes
+
+SPEED_HISTORY_LIMIT = 1000  # Per service
+MAX_SQL_PARAMETERS = 500  # Per query, SQLite limits the number of parameters
+EXPIRED_DETAILS_SWEEP_INTERVAL = 60  # Seconds between removing old cache entries and negative results of the memory backend
+
+# URL prefixes in the details that are stored as a single byte by the memory backend (with and without the app id following)
+# Rendered JSON never contains raw control bytes, orjson escapes them in strings
+URL_PREFIXES = (
+    b"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/",
+    b"https://shared.fastly.steamstatic.com/store_item_assets/steam/apps/",
+    b"https://cdn.akamai.steamstatic.com/steam/apps/",
+    b"https://store.steampowered.com/app/",
+    b"https://steamdb.info/app/",
+    b"https://www.protondb.com/app/",
+    b"https://howlongtobeat.com/game/",
+    b"https://www.keyforsteam.de/"
+)
+_APP_PREFIX_MARKERS = [bytes([0x01 + i]) for i in range(len(URL_PREFIXES))]
+_PREFIX_MARKERS = [bytes([0x11 + i]) for i in range(len(URL_PREFIXES))]
+
+
+def compact_body(appid: int, body: bytes) -> tuple[bytes, int]:
+    """
+    Replace the known URL prefixes by marker bytes, so only the suffixes (like screenshot paths) are stored.
+
+    Return the body and a bit mask of the used markers (0 if nothing was replaced).
+    """
+    if any(marker in body for marker in _APP_PREFIX_MARKERS + _PREFIX_MARKERS):  # Not from render_details, keep it as it is
+        return body, 0
+    app_path = f"{appid}/".encode()
+    markers = 0
+    for i, (prefix, app_prefix_marker, prefix_marker) in enumerate(zip(URL_PREFIXES, _APP_PREFIX_MARKERS, _PREFIX_MARKERS, strict=True)):
+        if prefix in body:
+            app_prefix = prefix + app_path
+            if app_prefix in body:
+                body = body.replace(app_prefix, app_prefix_marker)
+                markers |= 1 << i
+            if prefix in body:
+                body = body.replace(prefix, prefix_marker)
+                markers |= 1 << (i + len(URL_PREFIXES))
+    return body, markers
+
+
+def expand_body(appid: int, body: bytes, markers: int) -> bytes:
+    """Restore a body compacted by compact_body."""
+    app_path = f"{appid}/".encode()
+    for i, prefix in enumerate(URL_PREFIXES):
+        if markers & (1 << i):
+            body = body.replace(_APP_PREFIX_MARKERS[i], prefix + app_path)
+        if markers & (1 << (i + len(URL_PREFIXES))):
+            body = body.replace(_PREFIX_MARKERS[i], prefix)
+    return body
+
+
+class DetailsRecord(NamedTuple):
+    cache_time: float
+    body: bytes  # Ready-to-send JSON
+    digest: str  # For the ETag
+
+
+class ServiceStats(NamedTuple):
+    speed_history: list[float]
+    timeout_count: int
+    error_count: int
+    budget_exhausted_count: int
+    lookup_count: int
+    request_count: int  # Upstream requests of all lookups
+    tier_counts: dict[str, int]  # Lookups per tier that served them (like "http" and "browser" of SteamDB), empty for services without tiers
+
+
+def get_tier_counts(counts: dict[str, int]) -> dict[str, int]:
+    """Return the tier counts of the counters (counted as "<tier>_tier_count")."""
+    return {counter.removesuffix("_tier_count"): value for counter, value in counts.items() if counter.endswith("_tier_count")}
+
+
+class Backend:
+    """
+    Base class for the state shared between workers.
+
+    Holds the details cache, shared data like the steam app list and the service stats.
+    """
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}backend{ANSICodes.RESET}")
+
+    async def get_details(self, appid: int) -> DetailsRecord | None:
+        """Get the cached details for the app or None if there are no (unexpired) details."""
+        raise NotImplementedError
+
+    async def get_many_details(self, appids: list[int]) -> dict[int, DetailsRecord]:
+        """Get the cached details for many apps at once (apps without details are missing). You can override this."""
+        records: dict[int, DetailsRecord] = {}
+        for appid in appids:
+            record = await self.get_details(appid)
+            if record is not None:
+                records[appid] = record
+        return records
+
+    async def set_details(self, appid: int, record: DetailsRecord, max_age: float) -> None:
+        """Cache the details for the app until they are max_age seconds old."""
+        raise NotImplementedError
+
+    async def delete_details(self, appid: int) -> None:
+        """Remove the cached details for the app."""
+        raise NotImplementedError
+
+    async def get_blob(self, key: str) -> tuple[float, bytes] | None:
+        """Get the update time and value of a shared blob or None if it doesn't exist."""
+        raise NotImplementedError
+
+    async def set_blob(self, key: str, value: bytes) -> None:
+        """Share a blob with the other workers."""
+        raise NotImplementedError
+
+    async def get_log(self, key: str) -> list[bytes]:
+        """Get the entries of a shared log in the order they were appended (empty if it doesn't exist)."""
+        raise NotImplementedError
+
+    async def append_log(self, key: str, entry: bytes) -> None:
+        """Append an entry to a shared log (atomically, so entries of other workers aren't lost)."""
+        raise NotImplementedError
+
+    async def has_negative_result(self, service_name: str, key: str) -> bool:
+        """Check if the service found nothing for the key and the negative result didn't expire yet."""
+        raise NotImplementedError
+
+    async def set_negative_result(self, service_name: str, key: str, ttl: float) -> None:
+        """Remember for ttl seconds that the service found nothing for the key."""
+        raise NotImplementedError
+
+    async def add_speed(self, service_name: str, seconds: float) -> None:
+        """Add a run time to the speed history of the service."""
+        raise NotImplementedError
+
+    async def increment_count(self, service_name: str, counter: str, amount: int = 1) -> None:
+        """Increment a counter of the service (like timeout_count or error_count)."""
+        raise NotImplementedError
+
+    async def get_service_stats(self, service_name: str) -> ServiceStats:
+        """Get the stats of the service."""
+        raise NotImplementedError
+
+
+class CompactDetails:
+    """Cached details as kept by the memory backend."""
+
+    __slots__ = ("expiry_time", "cache_time", "body", "markers", "digest")
+
+    def __init__(self, appid: int, record: DetailsRecord, expiry_time: float) -> None:
+        self.expiry_time = expiry_time
+        self.cache_time = record.cache_time
+        self.body, self.markers = compact_body(appid, record.body)
+        self.digest = bytes.fromhex(record.digest)  # 16 bytes instead of a 32 character string
+
+    def record(self, appid: int) -> DetailsRecord:
+        """Return the details as they were stored."""
+        return DetailsRecord(self.cache_time, expand_body(appid, self.body, self.markers) if self.markers else self.body, self.digest.hex())
+
+
+class MemoryBackend(Backend):
+    """Keep everything in the memory of this process (nothing is shared)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._details: dict[int, CompactDetails] = {}
+        self._next_sweep_time = 0.0
+        self._speed_histories: dict[str, list[float]] = {}
+        self._counts: dict[tuple[str, str], int] = {}
+        self._blobs: dict[str, tuple[float, bytes]] = {}  # key -> (update time, value)
+        self._logs: dict[str, list[bytes]] = {}
+        self._negative_results: dict[tuple[str, str], float] = {}  # (service, key) -> expiry time
+        self._next_negative_sweep_time = 0.0
+
+    async def get_details(self, appid: int) -> DetailsRecord | None:  # noqa: D102
+        details = self._details.get(appid)
+        if details is None:
+            return
+        if details.expiry_time < time.time():
+            self.logger.debug(f"Removing old cache entry: {appid}")
+            del self._details[appid]
+            return
+        return details.record(appid)
+
+    async def set_details(self, appid: int, record: DetailsRecord, max_age: float) -> None:  # noqa: D102
+        # Remove old cache entries (not on every call, that would be quadratic for a big cache)
+        now = time.time()
+        if now >= self._next_sweep_time:
+            self._next_sweep_time = now + EXPIRED_DETAILS_SWEEP_INTERVAL
+            for other_appid in [other_appid for other_appid, details in self._details.items() if details.expiry_time < now]:
+                self.logger.debug(f"Removing old cache entry: {other_appid}")
+                del self._details[other_appid]
+
+        self._details[appid] = CompactDetails(appid, record, record.cache_time + max_age)
+
+    async def delete_details(self, appid: int) -> None:  # noqa: D102
+        self._details.pop(appid, None)
+
+    async def get_blob(self, key: str) -> tuple[float, bytes] | None:  # noqa: D102
+        return self._blobs.get(key)
+
+    async def set_blob(self, key: str, value: bytes) -> None:  # noqa: D102
+        self._blobs[key] = (time.time(), value)
+
+    async def get_log(self, key: str) -> list[bytes]:  # noqa: D102
+        return list(self._logs.get(key, []))
+
+    async def append_log(self, key: str, entry: bytes) -> None:  # noqa: D102
+        self._logs.setdefault(key, []).append(entry)
+
+    async def has_negative_result(self, service_name: str, key: str) -> bool:  # noqa: D102
+        expiry_time = self._negative_results.get((service_name, key))
+        return expiry_time is not None and expiry_time >= time.time()
+
+    async def set_negative_result(self, service_name: str, key: str, ttl: float) -> None:  # noqa: D102
+        # Remove expired negative results (not on every call, like the cache entries)
+        now = time.time()
+        if now >= self._next_negative_sweep_time:
+            self._next_negative_sweep_time = now + EXPIRED_DETAILS_SWEEP_INTERVAL
+            for other_key in [other_key for other_key, expiry_time in self._negative_results.items() if expiry_time < now]:
+                del self._negative_results[other_key]
+
+        self._negative_results[(service_name, key)] = now + ttl
+
+    async def add_speed(self, service_name: str, seconds: float) -> None:  # noqa: D102
+        speed_history = self._speed_histories.setdefault(service_name, [])
+        speed_history.append(seconds)
+        del speed_history[:-SPEED_HISTORY_LIMIT]
+
+    async def increment_count(self, service_name: str, counter: str, amount: int = 1) -> None:  # noqa: D102
+        self._counts[(service_name, counter)] = self._counts.get((service_name, counter), 0) + amount
+
+    async def get_service_stats(self, service_name: str) -> ServiceStats:  # noqa: D102
+        counts = {counter: value for (name, counter), value in self._counts.items() if name == service_name}
+        return ServiceStats(
+            speed_history=list(self._speed_histories.get(service_name, [])),
+            timeout_count=counts.get("timeout_count", 0),
+            error_count=counts.get("error_count", 0),
+            budget_exhausted_count=counts.get("budget_exhausted_count", 0),
+            lookup_count=counts.get("lookup_count", 0),
+            request_count=counts.get("request_count", 0),
+            tier_counts=get_tier_counts(counts)
+        )
+
+
+class SQLiteBackend(Backend):
+    """Share everything between the workers of one machine with a SQLite database in WAL mode."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.logger.info(f"Opening SQLite database {repr(self.path)}")
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS details (
+                    appid INTEGER PRIMARY KEY,
+                    expiry_time REAL NOT NULL,
+                    cache_time REAL NOT NULL,
+                    body BLOB NOT NULL,
+                    digest TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS details_expiry_time ON details (expiry_time);
+                CREATE TABLE IF NOT EXISTS blobs (
+                    key TEXT PRIMARY KEY,
+                    update_time REAL NOT NULL,
+                    value BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    entry BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS logs_key ON logs (key, id);
+                CREATE TABLE IF NOT EXISTS negative_results (
+                    service TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    expiry_time REAL NOT NULL,
+                    PRIMARY KEY (service, key)
+                );
+                CREATE TABLE IF NOT EXISTS speeds (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    service TEXT NOT NULL,
+                    seconds REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS speeds_service ON speeds (service, id);
+                CREATE TABLE IF NOT EXISTS counts (
+                    service TEXT NOT NULL,
+                    counter TEXT NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (service, counter)
+                );
+            """)
+        return self._connection
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    async def _run(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        return await asyncio.to_thread(self._execute, sql, parameters)
+
+    async def get_details(self, appid: int) -> DetailsRecord | None:  # noqa: D102
+        rows = await self._run(
+            "SELECT cache_time, body, digest FROM details WHERE appid = ? AND expiry_time >= ?",
+            (appid, time.time())
+        )
+        if not rows:
+            return
+        return DetailsRecord(*rows[0])
+
+    async def get_many_details(self, appids: list[int]) -> dict[int, DetailsRecord]:  # noqa: D102
+        records: dict[int, DetailsRecord] = {}
+        now = time.time()
+        for start in range(0, len(appids), MAX_SQL_PARAMETERS):
+            chunk = appids[start:start + MAX_SQL_PARAMETERS]
+            rows = await self._run(
+                f"SELECT appid, cache_time, body, digest FROM details WHERE appid IN ({', '.join('?' * len(chunk))}) AND expiry_time >= ?",  # noqa: S608
+                (*chunk, now)
+            )
+            for appid, *record in rows:
+                records[appid] = DetailsRecord(*record)
+        return records
+
+    async def set_details(self, appid: int, record: DetailsRecord, max_age: float) -> None:  # noqa: D102
+        await self._run("DELETE FROM details WHERE expiry_time < ?", (time.time(),))  # Remove old cache entries
+        await self._run(
+            "INSERT OR REPLACE INTO details (appid, expiry_time, cache_time, body, digest) VALUES (?, ?, ?, ?, ?)",
+            (appid, record.cache_time + max_age, record.cache_time, record.body, record.digest)
+        )
+
+    async def delete_details(self, appid: int) -> None:  # noqa: D102
+        await self._run("DELETE FROM details WHERE appid = ?", (appid,))
+
+    async def get_blob(self, key: str) -> tuple[float, bytes] | None:  # noqa: D102
+        rows = await self._run("SELECT update_time, value FROM blobs WHERE key = ?", (key,))
+        if not rows:
+            return
+        return rows[0][0], rows[0][1]
+
+    async def set_blob(self, key: str, value: bytes) -> None:  # noqa: D102
+        await self._run("INSERT OR REPLACE INTO blobs (key, update_time, value) VALUES (?, ?, ?)", (key, time.time(), value))
+
+    async def get_log(self, key: str) -> list[bytes]:  # noqa: D102
+        return [entry for entry, in await self._run("SELECT entry FROM logs WHERE key = ? ORDER BY id", (key,))]
+
+    async def append_log(self, key: str, entry: bytes) -> None:  # noqa: D102
+        await self._run("INSERT INTO logs (key, entry) VALUES (?, ?)", (key, entry))
+
+    async def has_negative_result(self, service_name: str, key: str) -> bool:  # noqa: D102
+        rows = await self._run(
+            "SELECT 1 FROM negative_results WHERE service = ? AND key = ? AND expiry_time >= ?",
+            (service_name, key, time.time())
+        )
+        return bool(rows)
+
+    async def set_negative_result(self, service_name: str, key: str, ttl: float) -> None:  # noqa: D102
+        await self._run("DELETE FROM negative_results WHERE expiry_time < ?", (time.time(),))  # Remove expired negative results
+        await self._run(
+            "INSERT OR REPLACE INTO negative_results (service, key, expiry_time) VALUES (?, ?, ?)",
+            (service_name, key, time.time() + ttl)
+        )
+
+    async def add_speed(self, service_name: str, seconds: float) -> None:  # noqa: D102
+        await self._run("INSERT INTO speeds (service, seconds) VALUES (?, ?)", (service_name, seconds))
+        await self._run(
+            "DELETE FROM speeds WHERE service = ? AND id <= (SELECT id FROM speeds WHERE service = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (service_name, service_name, SPEED_HISTORY_LIMIT)
+        )
+
+    async def increment_count(self, service_name: str, counter: str, amount: int = 1) -> None:  # noqa: D102
+        await self._run(
+            "INSERT INTO counts (service, counter, value) VALUES (?, ?, ?) ON CONFLICT (service, counter) DO UPDATE SET value = value + excluded.value",
+            (service_name, counter, amount)
+        )
+
+    async def get_service_stats(self, service_name: str) -> ServiceStats:  # noqa: D102
+        speeds = await self._run("SELECT seconds FROM speeds WHERE service = ? ORDER BY id", (service_name,))
+        counts = dict(await self._run("SELECT counter, value FROM counts WHERE service = ?", (service_name,)))
+        return ServiceStats(
+            speed_history=[seconds for seconds, in speeds],
+            timeout_count=counts.get("timeout_count", 0),
+            error_count=counts.get("error_count", 0),
+            budget_exhausted_count=counts.get("budget_exhausted_count", 0),
+            lookup_count=counts.get("lookup_count", 0),
+            request_count=counts.get("request_count", 0),
+            tier_counts=get_tier_counts(counts)
+        )
+
+
+class RedisBackend(Backend):
+    """Share everything between workers and nodes with a server that speaks the Redis protocol (RESP)."""
+
+    def __init__(self, host: str, port: int, db: int) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self._lock = asyncio.Lock()
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def _read_reply(self) -> bytes | int | list | None:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":  # Simple string
+            return payload
+        elif kind == b"-":  # Error
+            raise Exception(f"Redis error: {payload.decode()}")
+        elif kind == b":":  # Integer
+            return int(payload)
+        elif kind == b"$":  # Bulk string
+            if payload == b"-1":
+                return
+            data = await self._reader.readexactly(int(payload) + 2)
+            return data[:-2]
+        elif kind == b"*":  # Array
+            if payload == b"-1":
+                return
+            return [await self._read_reply() for _ in range(int(payload))]
+        raise Exception(f"Unexpected Redis reply: {repr(line)}")
+
+    async def _execute(self, *commands: tuple[str | bytes | int | float, ...]) -> list[bytes | int | list | None]:
+        """Send the commands in one pipeline and return their replies."""
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                self.logger.info(f"Connecting to Redis at {self.host}:{self.port}")
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                if self.db != 0:
+                    commands = (("SELECT", self.db), *commands)
+                    skip = 1
+                else:
+                    skip = 0
+            else:
+                skip = 0
+
+            request = bytearray()
+            for command in commands:
+                request += f"*{len(command)}\r\n".encode()
+                for argument in command:
+                    if not isinstance(argument, bytes):
+                        argument = str(argument).encode()
+                    request += f"${len(argument)}\r\n".encode() + argument + b"\r\n"
+            try:
+                self._writer.write(request)
+                await self._writer.drain()
+                replies = [await self._read_reply() for _ in commands]
+            except BaseException:  # Also when cancelled, the replies of the commands would be read by the next ones
+                self._writer.close()  # Don't reuse a connection in an unknown state
+                self._reader = self._writer = None
+                raise
+            return replies[skip:]
+
+    async def get_details(self, appid: int) -> DetailsRecord | None:  # noqa: D102
+        reply, = await self._execute(("HMGET", f"details:{appid}", "cache_time", "body", "digest"))
+        if reply is None or reply[0] is None:
+            return
+        return DetailsRecord(float(reply[0]), reply[1], reply[2].decode())
+
+    async def get_many_details(self, appids: list[int]) -> dict[int, DetailsRecord]:  # noqa: D102
+        if not appids:
+            return {}
+        replies = await self._execute(*(("HMGET", f"details:{appid}", "cache_time", "body", "digest") for appid in appids))
+        return {
+            appid: DetailsRecord(float(reply[0]), reply[1], reply[2].decode())
+            for appid, reply in zip(appids, replies, strict=True)
+            if reply is not None and reply[0] is not None
+        }
+
+    async def set_details(self, appid: int, record: DetailsRecord, max_age: float) -> None:  # noqa: D102
+        await self._execute(
+            ("HSET", f"details:{appid}", "cache_time", repr(record.cache_time), "body", record.body, "digest", record.digest),
+            ("PEXPIREAT", f"details:{appid}", int((record.cache_time + max_age) * 1000))  # Redis removes old cache entries
+        )
+
+    async def delete_details(self, appid: int) -> None:  # noqa: D102
+        await self._execute(("DEL", f"details:{appid}"))
+
+    async def get_blob(self, key: str) -> tuple[float, bytes] | None:  # noqa: D102
+        reply, = await self._execute(("HMGET", f"blob:{key}", "update_time", "value"))
+        if reply is None or reply[0] is None:
+            return
+        return float(reply[0]), reply[1]
+
+    async def set_blob(self, key: str, value: bytes) -> None:  # noqa: D102
+        await self._execute(("HSET", f"blob:{key}", "update_time", repr(time.time()), "value", value))
+
+    async def get_log(self, key: str) -> list[bytes]:  # noqa: D102
+        reply, = await self._execute(("LRANGE", f"log:{key}", 0, -1))
+        return reply
+
+    async def append_log(self, key: str, entry: bytes) -> None:  # noqa: D102
+        await self._execute(("RPUSH", f"log:{key}", entry))
+
+    async def has_negative_result(self, service_name: str, key: str) -> bool:  # noqa: D102
+        reply, = await self._execute(("EXISTS", f"negative:{service_name}:{key}"))
+        return reply == 1
+
+    async def set_negative_result(self, service_name: str, key: str, ttl: float) -> None:  # noqa: D102
+        await self._execute(("SET", f"negative:{service_name}:{key}", 1, "PX", int(ttl * 1000)))  # Redis removes expired negative results
+
+    async def add_speed(self, service_name: str, seconds: float) -> None:  # noqa: D102
+        await self._execute(
+            ("RPUSH", f"speeds:{service_name}", repr(seconds)),
+            ("LTRIM", f"speeds:{service_name}", -SPEED_HISTORY_LIMIT, -1)
+        )
+
+    async def increment_count(self, service_name: str, counter: str, amount: int = 1) -> None:  # noqa: D102
+        await self._execute(("HINCRBY", f"counts:{service_name}", counter, amount))
+
+    async def get_service_stats(self, service_name: str) -> ServiceStats:  # noqa: D102
+        speeds, count_items = await self._execute(
+            ("LRANGE", f"speeds:{service_name}", 0, -1),
+            ("HGETALL", f"counts:{service_name}")
+        )
+        counts = {counter.decode(): int(value) for counter, value in zip(count_items[::2], count_items[1::2], strict=True)}
+        return ServiceStats(
+            speed_history=[float(seconds) for seconds in speeds],
+            timeout_count=counts.get("timeout_count", 0),
+            error_count=counts.get("error_count", 0),
+            budget_exhausted_count=counts.get("budget_exhausted_count", 0),
+            lookup_count=counts.get("lookup_count", 0),
+            request_count=counts.get("request_count", 0),
+            tier_counts=get_tier_counts(counts)
+        )
+
+
+def create_backend(url: str) -> Backend:
+    """
+    Create a backend from a URL.
+
+    Examples:
+    1. memory://
+    2. sqlite:///steam_details.db (relative to the working directory, like SQLAlchemy)
+    3. sqlite:////absolute/path/to/steam_details.db
+    4. redis://localhost:6379/0
+
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.scheme == "memory":
+        return MemoryBackend()
+    elif parsed_url.scheme == "sqlite":
+        return SQLiteBackend(parsed_url.path.removeprefix("/") if not parsed_url.netloc else parsed_url.netloc + parsed_url.path)
+    elif parsed_url.scheme == "redis":
+        return RedisBackend(
+            parsed_url.hostname or "localhost",
+            parsed_url.port or 6379,
+            int(parsed_url.path.lstrip("/") or 0)
+        )
+    raise ValueError(f"Unknown backend: {repr(url)}")
+
+
+# Set by the CLI, so every worker uses the same backend
+backend = create_backend(os.environ.get("STEAM_DETAILS_BACKEND", "memory://"))
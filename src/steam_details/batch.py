@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from collections.abc import Iterable
+from typing import BinaryIO
+
+import orjson
+
+from .scheduler import Priority, current_priority
+from .utils import ANSICodes
+
+DEFAULT_PARALLEL = 8  # Games looked up at the same time, the services still limit their own calls
+
+
+def read_appids(lines: Iterable[str]) -> list[int]:
+    """Return the app ids of the lines (one per line, empty lines and # comments are skipped)."""
+    appids: list[int] = []
+    for number, line in enumerate(lines, start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if not line.isdigit():
+            raise ValueError(f"Invalid app id in line {number}: {repr(line)}")
+        appids.append(int(line))
+    return appids
+
+
+class BatchRun:
+    """
+    Look up the details of many games with the services of the web server and write one JSON line per game.
+
+    Finished app ids are appended to the checkpoint, so an interrupted run continues where it stopped.
+    Games that failed or that have failed services (like an exhausted request budget) are not checkpointed and are looked up
+    again by the next run.
+    """
+
+    def __init__(self, output: BinaryIO, checkpoint_path: str | None = None, parallel: int = DEFAULT_PARALLEL) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}batch{ANSICodes.RESET}")
+
+        self.output = output
+        self.checkpoint_path = checkpoint_path
+        self.parallel = parallel
+
+        self.done_appids: set[int] = set()  # Of this and earlier runs
+        self.skipped_count = 0
+        self.found_count = 0
+        self.incomplete_count = 0  # Found, but some services failed
+        self.not_found_count = 0
+        self.failed_count = 0
+        self.durations: list[float] = []  # Seconds per looked up game
+
+    def _load_checkpoint(self) -> None:
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            self.done_appids = set(read_appids(f))
+        self.logger.info(f"Resuming after {len(self.done_appids)} finished games")
+
+    def _write(self, line: dict) -> None:
+        self.output.write(orjson.dumps(line) + b"\n")
+        self.output.flush()
+
+    def _finish(self, appid: int) -> None:
+        self.done_appids.add(appid)
+        if self.checkpoint_path is not None:
+            with open(self.checkpoint_path, "a") as f:
+                f.write(f"{appid}\n")
+
+    async def _look_up(self, appid: int) -> None:
+        from .details import collect_details, store_details
+        from .service_manager import service_manager
+
+        start_time = time.perf_counter()
+        try:
+            steam = await service_manager.steam.create_task(appid=appid)
+            if steam is None:
+                self._write({"appid": appid, "error": "App not found"})
+                self.not_found_count += 1
+            else:
+                cached_details, _ = await collect_details(steam, timeout=None)
+                await store_details(appid, cached_details)  # Warms the cache of the web server with a shared backend
+                self._write({"appid": appid, "services": orjson.Fragment(cached_details.services_json)})
+                failed_services = [name for name, service in cached_details.services.items() if not service["success"]]
+                if failed_services:
+                    self.logger.warning(f"Services of {appid} failed, it is looked up again by the next run: {', '.join(failed_services)}")
+                    self.incomplete_count += 1
+                    return
+                self.found_count += 1
+        except Exception as e:  # noqa: BLE001
+            self.logger.error(f"Could not look up {appid}: {e.__class__.__name__}: {e}")
+            self._write({"appid": appid, "error": f"{e.__class__.__name__}: {e}"})
+            self.failed_count += 1
+            return
+        finally:
+            self.durations.append(time.perf_counter() - start_time)
+        self._finish(appid)
+
+    async def _work(self, queue: asyncio.Queue[int]) -> None:
+        while not queue.empty():
+            await self._look_up(queue.get_nowait())
+
+    async def run(self, wishlists: list[str], appids: list[int]) -> None:
+        """Look up the games of the wishlists and the app ids (each game once, in order)."""
+        # Imported late, the backend is created on import from the environment set by the CLI
+        from .service_manager import service_manager
+
+        current_priority.set(Priority.BATCH)  # Interactive lookups of a web server on the same backend aren't affected
+        await service_manager.load_services()
+        self._load_checkpoint()
+
+        all_appids: list[int] = []
+        for profile_name_or_id in wishlists:
+            wishlist = await service_manager.get_wishlist(profile_name_or_id)
+            if wishlist is None:
+                raise ValueError(f"Wishlist {repr(profile_name_or_id)} not found (it must be public)")
+            all_appids.extend(wishlist)
+        all_appids.extend(appids)
+
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for appid in dict.fromkeys(all_appids):
+            if appid in self.done_appids:
+                self.skipped_count += 1
+            else:
+                queue.put_nowait(appid)
+        self.logger.info(f"Looking up {queue.qsize()} games ({self.skipped_count} already done)")
+
+        await asyncio.gather(*(self._work(queue) for _ in range(self.parallel)))
+
+    def print_stats(self, elapsed: float) -> None:
+        """Print the throughput of the run to stderr."""
+        count = len(self.durations)
+        lines = [
+            f"{count} games in {elapsed:.1f}s ({count / elapsed if elapsed > 0 else 0:.2f} games/s)",
+            f"  found {self.found_count}, incomplete {self.incomplete_count}, not found {self.not_found_count}, failed {self.failed_count}, "
+            f"skipped {self.skipped_count}"
+        ]
+        if count >= 2:
+            quantiles = statistics.quantiles(self.durations, n=20, method="inclusive")
+            lines.append(f"  per game: p50 {statistics.median(self.durations):.2f}s, p95 {quantiles[-1]:.2f}s, max {max(self.durations):.2f}s")
+        print("\n".join(lines), file=sys.stderr)
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TypeVar
+
+from .utils import ANSICodes
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+T = TypeVar("T")
+
+
+class CPUPool:
+    """
+    Run CPU-bound work (like parsing pages) outside of the event loop, in worker processes if possible and in threads otherwise.
+
+    Functions have to be defined at module level and take and return plain data, it's pickled between the processes.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}cpu_pool{ANSICodes.RESET}")
+        self.workers = workers  # Worker processes, 0 to only use threads
+        self._executor: Executor | None = None
+
+    def configure(self, workers: int) -> None:
+        """Change the number of worker processes (before the first run)."""
+        self.workers = workers
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None and self.workers > 0:
+            try:
+                # Spawned, forking a process with running threads (like the one of the HTTP cache) can deadlock
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError) as e:
+                self.logger.warning(f"Can't start worker processes, using threads: {e.__class__.__name__}: {e}")
+            else:
+                self.logger.debug(f"Started a pool of {self.workers} worker processes")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max(self.workers, 1), thread_name_prefix="cpu_pool")
+        return self._executor
+
+    def _use_threads(self) -> None:
+        if isinstance(self._executor, ProcessPoolExecutor):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ThreadPoolExecutor(max(self.workers, 1), thread_name_prefix="cpu_pool")
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        """Run the function with the arguments in the pool and return its result."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), function, *args)
+        except (BrokenProcessPool, OSError) as e:
+            if isinstance(self._executor, ThreadPoolExecutor):
+                raise e
+            self.logger.error(f"Worker processes failed, using threads: {e.__class__.__name__}: {e}")
+            self._use_threads()
+            return await loop.run_in_executor(self._executor, function, *args)
+
+
+cpu_pool = CPUPool(int(os.environ.get("STEAM_DETAILS_CPU_WORKERS", DEFAULT_WORKERS)))
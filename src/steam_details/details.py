@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import os
+import time
+import traceback
+from typing import Any, Literal
+
+import orjson
+from typing_extensions import TypedDict
+
+from .backend import DetailsRecord, backend
+from .request_budget import RequestBudgetExhaustedError
+from .service import Service, ServiceCall
+from .service_manager import service_manager
+from .services.steam import SteamDetails
+from .utils import ANSICodes, make_digest
+
+DETAILS_MAX_AGE = 60 * 15  # Seconds until cached details are stale
+BUDGET_RETRY_DELAY = 60 * 5  # Seconds until details with an exhausted request budget are stale
+DETAILS_STALE_GRACE = int(os.environ.get("STEAM_DETAILS_STALE_GRACE", 60 * 60 * 24))  # Seconds stale details are still served while they are refreshed
+
+logger = logging.getLogger(f"{ANSICodes.MAGENTA}details{ANSICodes.RESET}")
+
+
+class ServiceDetails(TypedDict):
+    success: Literal[True]
+    data: Any
+
+
+class ServiceError(TypedDict):
+    success: Literal[False]
+    error: str
+    url: str
+
+
+class ServicePending(TypedDict):
+    success: Literal[False]
+    pending: Literal[True]
+    error: str
+    url: str
+
+
+class ServiceRetry(TypedDict):
+    success: Literal[False]
+    retry: Literal[True]  # The request budget was exhausted, the service is tried again when the details are refreshed
+    error: str
+    url: str
+
+
+class Details(TypedDict):
+    services: dict[str, ServiceDetails | ServicePending | ServiceRetry | ServiceError]
+    pending: list[str]
+    from_cache: bool
+
+
+def render_details(services_json: bytes, pending: list[str], from_cache: bool) -> bytes:
+    """Render the details as JSON around the already serialized services."""
+    return orjson.dumps({
+        "services": orjson.Fragment(services_json),
+        "pending": pending,
+        "from_cache": from_cache
+    })
+
+
+class CachedDetails:
+    """The services of a game, kept as ready-to-send JSON."""
+
+    def __init__(self, services: dict[str, ServiceDetails | ServicePending | ServiceRetry | ServiceError]) -> None:
+        self.cache_time = time.time()
+        self.services = services
+        self.update()
+
+    def update(self) -> None:
+        """Serialize the services (again after a background task changed them)."""
+        self.services_json = orjson.dumps(self.services)
+        self.pending = get_pending_services(self.services)
+        self.retry = any(service.get("retry") is True for service in self.services.values())
+        self.body = render_details(self.services_json, self.pending, from_cache=True)
+        self.digest = make_digest(self.body)
+
+    def record(self) -> DetailsRecord:
+        """Return the record that is stored in the backend."""
+        cache_time = self.cache_time
+        if self.retry:  # Becomes stale after BUDGET_RETRY_DELAY, so the next request retries the services
+            cache_time = min(cache_time, time.time() - DETAILS_MAX_AGE + BUDGET_RETRY_DELAY)
+        return DetailsRecord(cache_time, self.body, self.digest)
+
+
+async def get_json_from_call(call: ServiceCall) -> ServiceDetails | ServiceRetry | ServiceError:
+    """Wait for the call and return the result as a JSON object with success status."""
+    try:
+        response = await call.task
+        if response is None:
+            return {
+                "success": True,
+                "data": None
+            }
+        else:
+            return {
+                "success": True,
+                "data": response.model_dump()
+            }
+    except RequestBudgetExhaustedError as e:
+        return {
+            "success": False,
+            "retry": True,
+            "error": str(e),
+            "url": call.error_url
+        }
+    except Exception as e:  # noqa: BLE001
+        traceback.print_exc()
+        return {
+            "success": False,
+            "error": f"{e.__class__.__name__}: {e}",
+            "url": call.error_url
+        }
+
+
+def get_pending_services(services: dict[str, ServiceDetails | ServicePending | ServiceRetry | ServiceError]) -> list[str]:
+    """Return the names of all services that are still running in the background."""
+    return [name for name, service in services.items() if service.get("pending") is True]
+
+
+async def store_details(appid: int, cached_details: CachedDetails) -> None:
+    """Store the details in the backend, they are kept during the stale grace period as well."""
+    await backend.set_details(appid, cached_details.record(), DETAILS_MAX_AGE + DETAILS_STALE_GRACE)
+
+
+async def complete_in_background(
+    appid: int,
+    cached_details: CachedDetails,
+    pending_tasks: dict[str, asyncio.Task[ServiceDetails | ServiceRetry | ServiceError]]
+) -> None:
+    """
+    Wait for the pending tasks and write their results into the cached details.
+
+    Stops if the stored details were replaced in the meantime (like by a lookup without the cache or a refresh), so the newer
+    details aren't overwritten with this older lookup.
+    """
+    for name, task in pending_tasks.items():
+        result = await task
+        record = await backend.get_details(appid)
+        if record is None or record.digest != cached_details.digest:
+            logger.info(f"Details of app {appid} were replaced, dropping the background result of {name}")
+            for other_task in pending_tasks.values():
+                other_task.cancel()
+            return
+        cached_details.services[name] = result
+        cached_details.update()
+        await store_details(appid, cached_details)
+        logger.debug(f"Background task {name} finished")
+
+
+async def collect_details(
+    steam: SteamDetails,
+    timeout: float | None  # noqa: ASYNC109
+) -> tuple[CachedDetails, dict[str, asyncio.Task[ServiceDetails | ServiceRetry | ServiceError]]]:
+    """
+    Run all services for the game.
+
+    Return the details and the tasks that didn't finish within the timeout (marked as pending in the details).
+    """
+    if not steam.released:
+        services: dict[str, ServiceDetails | ServicePending | ServiceRetry | ServiceError] = {
+            "steam": {
+                "success": True,
+                "data": steam.model_dump()
+            },
+            "steam_historical_low": {
+                "success": True,
+                "data": None
+            },
+            "key_and_gift_sellers": {
+                "success": True,
+                "data": None
+            },
+            "game_length": {
+                "success": True,
+                "data": None
+            },
+            "linux_support": {
+                "success": True,
+                "data": None
+            }
+        }
+        return CachedDetails(services), {}
+
+    services = {
+        "steam": {
+            "success": True,
+            "data": steam.model_dump()
+        }
+    }
+    task_services: dict[str, Service] = {}
+
+    # Steam historical low
+    if steam.price is None:
+        services["steam_historical_low"] = {
+            "success": True,
+            "data": None
+        }
+    elif steam.price > 0:
+        task_services["steam_historical_low"] = service_manager.steamdb
+    else:
+        services["steam_historical_low"] = {
+            "success": True,
+            "data": {
+                "price": 0.0,
+                "discount": 0,
+                "iso_date": None,
+                "external_url": None
+            }
+        }
+
+    # Key and gift sellers
+    if steam.price is not None and steam.price > 0:
+        task_services["key_and_gift_sellers"] = service_manager.keyforsteam
+    else:
+        services["key_and_gift_sellers"] = {
+            "success": True,
+            "data": None
+        }
+
+    # Game length
+    task_services["game_length"] = service_manager.how_long_to_beat
+
+    # Linux support
+    if steam.native_linux_support:
+        services["linux_support"] = {
+            "success": True,
+            "data": None
+        }
+    else:
+        task_services["linux_support"] = service_manager.protondb
+
+    # Create JSON tasks
+    json_tasks: dict[str, asyncio.Task[ServiceDetails | ServiceRetry | ServiceError]] = {}
+    for name, service in task_services.items():
+        json_tasks[name] = asyncio.create_task(get_json_from_call(service.start_call(steam=steam)))
+
+    # Run tasks until they are done or the timeout is reached
+    if json_tasks:
+        try:
+            await asyncio.wait(json_tasks.values(), timeout=timeout)
+        except asyncio.CancelledError:  # Nobody waits for the results anymore, stop their upstream requests
+            for task in json_tasks.values():
+                task.cancel()
+            raise
+
+    pending_tasks: dict[str, asyncio.Task[ServiceDetails | ServiceRetry | ServiceError]] = {}
+    for name, task in json_tasks.items():
+        if task.done():
+            services[name] = task.result()
+        else:
+            logger.info(f"Budget exhausted, {name} continues in the background")
+            pending_tasks[name] = task
+            services[name] = {
+                "success": False,
+                "pending": True,
+                "error": "Still loading in the background",
+                "url": task_services[name].default_error_url.format(steam=steam)
+            }
+
+    return CachedDetails(services), pending_tasks
+
+
+async def lookup_details(appid: int) -> None:
+    """Look up all details of the game and store them (the stored details are removed if the app is gone)."""
+    steam = await service_manager.steam.create_task(appid=appid)
+    if steam is None:
+        await backend.delete_details(appid)
+        return
+    cached_details, _ = await collect_details(steam, timeout=None)
+    await store_details(appid, cached_details)
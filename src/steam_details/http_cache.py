@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple
+
+import httpx
+import orjson
+
+# Status codes that are cacheable by default (RFC 9110, section 15.1)
+CACHEABLE_STATUS_CODES = {200, 203, 204, 206, 300, 301, 308, 404, 405, 410, 414, 501}
+
+HEURISTIC_FRACTION = 0.1  # Of the time since Last-Modified (RFC 9111, section 4.2.2)
+HEURISTIC_MAX_LIFETIME = 60 * 60 * 24
+
+DEFAULT_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "steam_details", "http_cache.db")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class CacheEntry(NamedTuple):
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes  # As received, still content encoded
+    vary: dict[str, str | None]  # Request header -> value for the headers named in Vary
+    response_time: float
+
+
+def parse_cache_control(headers: httpx.Headers) -> dict[str, str | None]:
+    """Parse the Cache-Control directives (lowercase names, unquoted values)."""
+    directives: dict[str, str | None] = {}
+    for value in headers.get_list("cache-control", split_commas=True):
+        name, _, argument = value.strip().partition("=")
+        if name:
+            directives[name.strip().lower()] = argument.strip().strip('"') if argument else None
+    return directives
+
+
+def _parse_seconds(value: str | None) -> int | None:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return
+
+
+def _parse_date(value: str | None) -> float | None:
+    if value is None:
+        return
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return
+
+
+def freshness_lifetime(headers: httpx.Headers, response_time: float) -> float:
+    """Return how many seconds the response is fresh after it was generated (RFC 9111, section 4.2.1)."""
+    max_age = _parse_seconds(parse_cache_control(headers).get("max-age"))
+    if max_age is not None:
+        return max_age
+    date = _parse_date(headers.get("date")) or response_time
+    if "expires" in headers:
+        expires = _parse_date(headers["expires"])
+        return 0 if expires is None else max(0.0, expires - date)
+    last_modified = _parse_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(max(0.0, date - last_modified) * HEURISTIC_FRACTION, HEURISTIC_MAX_LIFETIME)
+    return 0
+
+
+def current_age(headers: httpx.Headers, response_time: float) -> float:
+    """Return the age of a stored response (RFC 9111, section 4.2.3, simplified for a local cache)."""
+    age = _parse_seconds(headers.get("age")) or 0
+    return age + max(0.0, time.time() - response_time)
+
+
+class HTTPCache:
+    """
+    Private HTTP cache (RFC 9111) in a SQLite database, shared by all workers.
+
+    Entries are evicted in least recently used order when the size of all bodies exceeds max_size.
+    """
+
+    def __init__(self, path: str | None = DEFAULT_PATH, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        # Imported here because the http client in utils is created with this cache
+        from .utils import ANSICodes
+
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}http_cache{ANSICodes.RESET}")
+        self.path = path  # None disables the cache
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def configure(self, path: str | None, max_size: int) -> None:
+        """Change the database (before the first request)."""
+        self.path = path
+        self.max_size = max_size
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.logger.info(f"Opening HTTP cache {repr(self.path)}")
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    status_code INTEGER NOT NULL,
+                    headers BLOB NOT NULL,
+                    body BLOB NOT NULL,
+                    vary BLOB NOT NULL,
+                    response_time REAL NOT NULL,
+                    access_time REAL NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_access_time ON responses (access_time);
+            """)
+        return self._connection
+
+    def _get(self, url: str) -> CacheEntry | None:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT status_code, headers, body, vary, response_time FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return
+            connection.execute("UPDATE responses SET access_time = ? WHERE url = ?", (time.time(), url))
+        status_code, headers, body, vary, response_time = row
+        return CacheEntry(status_code, [tuple(header) for header in orjson.loads(headers)], body, orjson.loads(vary), response_time)
+
+    def _set(self, url: str, entry: CacheEntry) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (url, status_code, headers, body, vary, response_time, access_time, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, entry.status_code, orjson.dumps(entry.headers), entry.body, orjson.dumps(entry.vary), entry.response_time, time.time(), len(entry.body))
+            )
+
+            # Evict the least recently used responses
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size:
+                evicted_urls: list[str] = []
+                for evicted_url, size in connection.execute("SELECT url, size FROM responses ORDER BY access_time"):
+                    evicted_urls.append(evicted_url)
+                    total_size -= size
+                    if total_size <= self.max_size:
+                        break
+                connection.executemany("DELETE FROM responses WHERE url = ?", [(evicted_url,) for evicted_url in evicted_urls])
+                self.logger.debug(f"Evicted {len(evicted_urls)} responses")
+
+    async def get(self, url: str) -> CacheEntry | None:
+        """Get the stored response for the URL."""
+        return await asyncio.to_thread(self._get, url)
+
+    async def set(self, url: str, entry: CacheEntry) -> None:
+        """Store the response for the URL, replacing the previous one."""
+        await asyncio.to_thread(self._set, url, entry)
+
+
+class CacheTransport(httpx.AsyncBaseTransport):
+    """Answer GET requests from the HTTP cache if possible and revalidate stale responses with conditional requests."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: HTTPCache) -> None:
+        self.transport = transport
+        self.cache = cache
+
+    @staticmethod
+    def _response(entry: CacheEntry, request: httpx.Request) -> httpx.Response:
+        headers = httpx.Headers(entry.headers)
+        headers["Age"] = str(int(current_age(headers, entry.response_time)))
+        return httpx.Response(entry.status_code, headers=headers, stream=httpx.ByteStream(entry.body), request=request)
+
+    async def _store(self, request: httpx.Request, response: httpx.Response, response_time: float) -> httpx.Response:
+        """Store the response if it is cacheable and return it (its body is read)."""
+        directives = parse_cache_control(response.headers)
+        vary = [name.strip().lower() for name in response.headers.get_list("vary", split_commas=True)]
+        if (
+            response.status_code not in CACHEABLE_STATUS_CODES
+            or "no-store" in directives
+            or "*" in vary
+            or (  # Useless without freshness or validators
+                freshness_lifetime(response.headers, response_time) <= 0
+                and "no-cache" not in directives
+                and "etag" not in response.headers
+                and "last-modified" not in response.headers
+            )
+        ):
+            return response
+
+        # Read the raw body from the stream, the client decodes it later
+        body = b"".join([chunk async for chunk in response.stream])
+        await response.aclose()
+        if len(body) > self.cache.max_size // 8:  # Don't evict everything for a single response
+            self.cache.logger.debug(f"Response too large to store: {request.url}")
+        else:
+            await self.cache.set(str(request.url), CacheEntry(
+                status_code=response.status_code,
+                headers=response.headers.multi_items(),
+                body=body,
+                vary={name: request.headers.get(name) for name in vary},
+                response_time=response_time
+            ))
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(body),
+            request=request,
+            extensions=response.extensions
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:  # noqa: D102
+        request_directives = parse_cache_control(request.headers)
+        if (
+            self.cache.path is None
+            or request.method != "GET"
+            or "no-store" in request_directives
+            or "if-none-match" in request.headers  # The caller handles conditional requests itself
+            or "if-modified-since" in request.headers
+        ):
+            return await self.transport.handle_async_request(request)
+
+        url = str(request.url)
+        entry = await self.cache.get(url)
+        if entry is not None and any(request.headers.get(name) != value for name, value in entry.vary.items()):
+            entry = None
+
+        if entry is not None:
+            headers = httpx.Headers(entry.headers)
+            directives = parse_cache_control(headers)
+            fresh = (
+                "no-cache" not in directives
+                and "no-cache" not in request_directives
+                and request_directives.get("max-age") != "0"
+                and freshness_lifetime(headers, entry.response_time) > current_age(headers, entry.response_time)
+            )
+            if fresh:
+                self.cache.logger.debug(f"Fresh response: {url}")
+                return self._response(entry, request)
+
+            # Revalidate
+            if "etag" in headers or "last-modified" in headers:
+                conditional_headers = request.headers.copy()
+                if "etag" in headers:
+                    conditional_headers["If-None-Match"] = headers["etag"]
+                if "last-modified" in headers:
+                    conditional_headers["If-Modified-Since"] = headers["last-modified"]
+                request_time = time.time()
+                response = await self.transport.handle_async_request(
+                    httpx.Request(request.method, request.url, headers=conditional_headers, extensions=request.extensions)
+                )
+                if response.status_code == 304:
+                    await response.aclose()
+                    self.cache.logger.debug(f"Revalidated response: {url}")
+
+                    # Update the stored headers (RFC 9111, section 4.3.4)
+                    for name, value in response.headers.items():
+                        if name not in ("content-length", "content-encoding", "transfer-encoding"):
+                            headers[name] = value
+                    entry = entry._replace(headers=headers.multi_items(), response_time=request_time)
+                    await self.cache.set(url, entry)
+                    return self._response(entry, request)
+                return await self._store(request, response, request_time)
+
+        request_time = time.time()
+        response = await self.transport.handle_async_request(request)
+        return await self._store(request, response, request_time)
+
+    async def aclose(self) -> None:  # noqa: D102
+        await self.transport.aclose()
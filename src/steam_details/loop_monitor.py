@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import FrameType
+
+from typing_extensions import TypedDict
+
+from .utils import ANSICodes
+
+HEARTBEAT_INTERVAL = 0.05  # Seconds between two heartbeats of the event loop
+BLOCKED_THRESHOLD = 0.1  # Seconds of lag after which the stack of the loop is recorded
+LAG_HISTORY_LIMIT = 2000  # Recent lags used for the percentiles
+BLOCKED_HISTORY_LIMIT = 20  # Recent blocking events that are kept with their stack
+MAX_STACK_DEPTH = 40  # Innermost frames of a recorded stack
+
+
+class BlockedLoop(TypedDict):
+    time: float  # Unix time the loop was blocked at
+    duration_ms: float
+    stack: list[str]  # "file:line function", outermost first, taken while the loop was blocked
+
+
+class LoopLag(TypedDict):
+    p50_ms: float | None
+    p99_ms: float | None
+    max_ms: float | None
+    threshold_ms: float
+    blocked_count: int
+    recent_blocks: list[BlockedLoop]  # Newest first
+
+
+def _format_stack(frame: FrameType) -> list[str]:
+    summary = traceback.StackSummary.extract(traceback.walk_stack(frame), limit=MAX_STACK_DEPTH, lookup_lines=False)
+    return [f"{entry.filename}:{entry.lineno} {entry.name}" for entry in reversed(summary)]
+
+
+class LoopMonitor:
+    """
+    Measure the scheduling delay of the event loop and record what blocked it.
+
+    A heartbeat task measures how late it wakes up. A watchdog thread takes the stack of the loop thread when the heartbeat is
+    overdue, so the code that blocks the loop is recorded while it is still running.
+    """
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}loop_monitor{ANSICodes.RESET}")
+        self.lags: deque[float] = deque(maxlen=LAG_HISTORY_LIMIT)
+        self.blocks: deque[BlockedLoop] = deque(maxlen=BLOCKED_HISTORY_LIMIT)
+        self.blocked_count = 0
+        self._last_heartbeat = time.perf_counter()
+        self._loop_thread_id: int | None = None
+        self._blocked_stack: list[str] | None = None  # Taken by the watchdog during the current block
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        """Start the heartbeat in the running loop and the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_heartbeat = time.perf_counter()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+        self.logger.debug("Started")
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start_time = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self._last_heartbeat = time.perf_counter()
+            lag = max(self._last_heartbeat - start_time - HEARTBEAT_INTERVAL, 0.0)
+            self.lags.append(lag)
+
+            stack, self._blocked_stack = self._blocked_stack, None
+            if lag >= BLOCKED_THRESHOLD:
+                stack = stack or []  # Empty if the block ended before the watchdog looked
+                self.blocked_count += 1
+                self.blocks.append(BlockedLoop(time=round(time.time() - lag, 3), duration_ms=round(lag * 1000, 1), stack=stack))
+                self.logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms in {stack[-1] if stack else 'unknown code'}")
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(BLOCKED_THRESHOLD / 4)
+            if self._blocked_stack is not None:  # Already taken for this block
+                continue
+            if time.perf_counter() - self._last_heartbeat < HEARTBEAT_INTERVAL + BLOCKED_THRESHOLD:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._blocked_stack = _format_stack(frame)
+
+    def get_lag(self) -> LoopLag:
+        """Return the lag percentiles and the recent blocking events."""
+        lags = sorted(self.lags)
+        return LoopLag(
+            p50_ms=round(lags[len(lags) // 2] * 1000, 2) if lags else None,
+            p99_ms=round(lags[min(int(len(lags) * 0.99), len(lags) - 1)] * 1000, 2) if lags else None,
+            max_ms=round(lags[-1] * 1000, 2) if lags else None,
+            threshold_ms=BLOCKED_THRESHOLD * 1000,
+            blocked_count=self.blocked_count,
+            recent_blocks=list(reversed(self.blocks))
+        )
+
+
+loop_monitor = LoopMonitor()
@@ -1,10 +1,22 @@
+import asyncio
+import copy
 import logging
+import os
+import sys
+import time
 from argparse import ArgumentParser
 
 import uvicorn
 
-from .utils import ANSICodes
-from .web.web import app
+from .batch import DEFAULT_PARALLEL
+from .cpu_pool import DEFAULT_WORKERS, cpu_pool
+from .http_cache import DEFAULT_MAX_SIZE, DEFAULT_PATH
+from .tracing import tracer
+from .utils import ANSICodes, http_cache
+
+logger = logging.getLogger(f"{ANSICodes.MAGENTA}main{ANSICodes.RESET}")
+
+LOG_FORMAT = f"%(asctime)s {{LEVEL_COLOR}}{ANSICodes.BOLD}[%(levelname)s]{ANSICodes.RESET} %(name)s ({ANSICodes.BLUE}%(filename)s:%(lineno)d{ANSICodes.RESET}) %(message)s"  # noqa
 
 
 class ColorFormatter(logging.Formatter):
@@ -24,6 +36,25 @@ class ColorFormatter(logging.Formatter):
         )
 
 
+def get_log_config() -> dict:
+    """Return the uvicorn log config extended by the colored root logger (applied in every worker)."""
+    log_config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    log_config["formatters"]["color"] = {
+        "()": f"{__package__}.main.ColorFormatter",
+        "fmt": LOG_FORMAT
+    }
+    log_config["handlers"]["color"] = {
+        "formatter": "color",
+        "class": "logging.StreamHandler",
+        "stream": "ext://sys.stderr"
+    }
+    log_config["root"] = {
+        "handlers": ["color"],
+        "level": "INFO"
+    }
+    return log_config
+
+
 def main() -> int:
     """Display some details for a steam app or a whole wishlist."""
     # Logging
@@ -34,14 +65,113 @@ def main() -> int:
             logging.StreamHandler()
         ]
     )
-    logging.getLogger().handlers[0].setFormatter(ColorFormatter(
-        f"%(asctime)s {{LEVEL_COLOR}}{ANSICodes.BOLD}[%(levelname)s]{ANSICodes.RESET} %(name)s ({ANSICodes.BLUE}%(filename)s:%(lineno)d{ANSICodes.RESET}) %(message)s"  # noqa
-    ))
+    logging.getLogger().handlers[0].setFormatter(ColorFormatter(LOG_FORMAT))
 
     parser = ArgumentParser()
     parser.add_argument(
         "-V", "--version", action="store_true", help="Show the version and exit."
     )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="Bind to this host. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Bind to this port. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--backend",
+        default=os.environ.get("STEAM_DETAILS_BACKEND", "memory://"),
+        help="Backend for the state shared between workers: memory://, sqlite:///relative/file.db, sqlite:////absolute/file.db or redis://host:port/db. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-cache",
+        default=os.environ.get("STEAM_DETAILS_HTTP_CACHE", DEFAULT_PATH),
+        help="SQLite database of the HTTP cache for upstream requests, an empty string disables it. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-cache-size",
+        type=int,
+        default=int(os.environ.get("STEAM_DETAILS_HTTP_CACHE_SIZE", DEFAULT_MAX_SIZE)) // (1024 * 1024),
+        help="Maximum size of the HTTP cache in MiB. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--stale-grace",
+        type=float,
+        default=int(os.environ.get("STEAM_DETAILS_STALE_GRACE", 60 * 60 * 24)) / 60,
+        help="Minutes cached details are still served after they expired while they are refreshed in the background. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--browser-profile",
+        default=os.environ.get("STEAM_DETAILS_BROWSER_PROFILE"),
+        help="Firefox profile directory for SteamDB, it keeps the cookies of a solved captcha. (default: ~/.cache/steam_details/steamdb_profile)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        default=os.environ.get("STEAM_DETAILS_CONCURRENCY", ""),
+        help='Concurrent calls per service like "SteamDB=1,ProtonDB=8", unlisted services keep their default (Steam 4, SteamDB 1, ProtonDB 8, KeyForSteam 2, HowLongToBeat 2).'
+    )
+    parser.add_argument(
+        "--request-budget",
+        default=os.environ.get("STEAM_DETAILS_REQUEST_BUDGET", ""),
+        help='Upstream requests per lookup and service like "KeyForSteam=4", unlisted services keep their default (Steam 4, SteamDB 4, ProtonDB 2, KeyForSteam 8, HowLongToBeat 11).'
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=int(os.environ.get("STEAM_DETAILS_CPU_WORKERS", DEFAULT_WORKERS)),
+        help="Processes per worker that parse pages and the app list outside of the event loop, 0 to use threads. (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--profiling",
+        action="store_true",
+        default=os.environ.get("STEAM_DETAILS_PROFILING") == "1",
+        help="Allow profiling API requests with the profile query parameter and the worker with /api/profile (returns folded stacks for flame graphs)."
+    )
+    parser.add_argument(
+        "--trace-file",
+        default=os.environ.get("STEAM_DETAILS_TRACE_FILE", ""),
+        help="Append finished spans to this file as OTLP JSON lines (one export request per line). Recent traces are always available at /api/trace/<id>."
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    watch_parser = subparsers.add_parser("watch", help="Watch wishlists for deals instead of running the web server.")
+    watch_parser.add_argument(
+        "--wishlist", action="append", required=True, help="Profile name or id of a wishlist to watch (repeatable)."
+    )
+    watch_parser.add_argument(
+        "--interval", type=float, default=60, help="Minutes between checks. (default: %(default)s)"
+    )
+    watch_parser.add_argument(
+        "--once", action="store_true", help="Check once and exit."
+    )
+    watch_parser.add_argument(
+        "--webhook", help="POST alerts as JSON to this URL (alerts are always logged)."
+    )
+    watch_parser.add_argument(
+        "--min-discount", type=int, help="Alert when the steam discount reaches this percentage."
+    )
+    watch_parser.add_argument(
+        "--max-price", type=float, help="Alert when the steam or key price drops to this price."
+    )
+
+    batch_parser = subparsers.add_parser("batch", help="Look up the details of many games and write them as JSON lines instead of running the web server.")
+    batch_parser.add_argument(
+        "--wishlist", action="append", default=[], help="Profile name or id of a wishlist to look up (repeatable)."
+    )
+    batch_parser.add_argument(
+        "--appids", action="append", default=[], help='File with one app id per line, "-" for stdin (repeatable, stdin if no wishlist or file is given).'
+    )
+    batch_parser.add_argument(
+        "--output", help="Append the JSON lines to this file instead of writing them to stdout."
+    )
+    batch_parser.add_argument(
+        "--checkpoint", help="File of the finished app ids, a run with the same checkpoint skips them. (default: <output>.checkpoint with --output)"
+    )
+    batch_parser.add_argument(
+        "--parallel", type=int, default=DEFAULT_PARALLEL, help="Games looked up at the same time, the services still limit their own calls. (default: %(default)s)"
+    )
 
     args = parser.parse_args()
 
@@ -50,6 +180,92 @@ def main() -> int:
         print(f"Steam Details {__version__}")
         return 0
 
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    if args.http_cache_size < 1:
+        parser.error("--http-cache-size must be at least 1")
+    if args.stale_grace < 0:
+        parser.error("--stale-grace must not be negative")
+    if args.cpu_workers < 0:
+        parser.error("--cpu-workers must not be negative")
+
+    # Workers read the HTTP cache from the environment, this process was already configured on import
+    os.environ["STEAM_DETAILS_HTTP_CACHE"] = args.http_cache
+    os.environ["STEAM_DETAILS_HTTP_CACHE_SIZE"] = str(args.http_cache_size * 1024 * 1024)
+    http_cache.configure(args.http_cache or None, args.http_cache_size * 1024 * 1024)
+    if args.browser_profile:  # Read when the SteamDB service is created
+        os.environ["STEAM_DETAILS_BROWSER_PROFILE"] = args.browser_profile
+    os.environ["STEAM_DETAILS_CONCURRENCY"] = args.concurrency  # Read when the services are created
+    os.environ["STEAM_DETAILS_REQUEST_BUDGET"] = args.request_budget
+    os.environ["STEAM_DETAILS_TRACE_FILE"] = args.trace_file
+    os.environ["STEAM_DETAILS_CPU_WORKERS"] = str(args.cpu_workers)
+    cpu_pool.configure(args.cpu_workers)
+    os.environ["STEAM_DETAILS_PROFILING"] = "1" if args.profiling else "0"  # Read when the api is imported
+    tracer.configure(args.trace_file or None)
+
+    if args.command == "watch":
+        if args.interval <= 0:
+            parser.error("--interval must be positive")
+        os.environ["STEAM_DETAILS_BACKEND"] = args.backend  # Read when the backend is imported
+        from .watcher import PriceWatcher
+        watcher = PriceWatcher(
+            args.wishlist,
+            args.interval * 60,
+            webhook_url=args.webhook,
+            min_discount=args.min_discount,
+            max_price=args.max_price
+        )
+        asyncio.run(watcher.run(once=args.once))
+        return 0
+
+    if args.command == "batch":
+        if args.parallel < 1:
+            parser.error("--parallel must be at least 1")
+        os.environ["STEAM_DETAILS_BACKEND"] = args.backend  # Read when the backend is imported
+        from .batch import BatchRun, read_appids
+
+        appids: list[int] = []
+        for path in args.appids if args.appids or args.wishlist else ["-"]:
+            try:
+                if path == "-":
+                    appids.extend(read_appids(sys.stdin))
+                else:
+                    with open(path) as f:
+                        appids.extend(read_appids(f))
+            except (OSError, ValueError) as e:
+                parser.error(f"Could not read app ids from {repr(path)}: {e}")
+
+        checkpoint_path = args.checkpoint or (None if args.output is None else f"{args.output}.checkpoint")
+        output = sys.stdout.buffer if args.output is None else open(args.output, "ab")
+        batch = BatchRun(output, checkpoint_path, args.parallel)
+        start_time = time.perf_counter()
+        try:
+            asyncio.run(batch.run(args.wishlist, appids))
+        except KeyboardInterrupt:
+            logger.warning("Interrupted, run again with the same checkpoint to continue")
+            return 130
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+        finally:
+            batch.print_stats(time.perf_counter() - start_time)
+            if args.output is not None:
+                output.close()
+        return 0
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.backend.startswith("memory:"):
+        logger.warning("Every worker has its own cache with the memory backend, consider using sqlite:// or redis://")
+
+    # The workers are separate processes, they read the backend from the environment
+    os.environ["STEAM_DETAILS_BACKEND"] = args.backend
+    os.environ["STEAM_DETAILS_STALE_GRACE"] = str(round(args.stale_grace * 60))
+
+    uvicorn.run(
+        f"{__package__}.web.web:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_config=get_log_config()
+    )
 
     return 0
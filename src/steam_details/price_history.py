@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import struct
+import time
+from array import array
+from typing import NamedTuple
+
+from .backend import backend
+from .utils import ANSICodes
+
+SOURCES = ("steam", "keyforsteam")
+
+NO_DISCOUNT = -1  # Stored for sources without a discount
+
+POINT_STRUCT = struct.Struct("<dfh")  # A stored point: float64 time, float32 price, int16 discount
+
+
+class PricePoint(NamedTuple):
+    time: float
+    price: float
+    discount: int | None
+
+
+class PriceSeries:
+    """
+    Price changes of one app from one source in parallel arrays.
+
+    A point is only added when the price or discount changed, so the prices in between are the same as the previous point.
+    Every point is stored as a 14 byte entry of a shared log (see POINT_STRUCT).
+    """
+
+    __slots__ = ("times", "prices", "discounts")
+
+    def __init__(self) -> None:
+        self.times = array("d")
+        self.prices = array("f")
+        self.discounts = array("h")
+
+    @classmethod
+    def from_entries(cls, entries: list[bytes]) -> "PriceSeries":
+        """Load a series from its stored points (points without a change, like ones of workers racing, are skipped)."""
+        series = cls()
+        for entry in entries:
+            timestamp, price, discount = POINT_STRUCT.unpack(entry)
+            series.append(timestamp, price, None if discount == NO_DISCOUNT else discount)
+        return series
+
+    @staticmethod
+    def to_entry(timestamp: float, price: float, discount: int | None) -> bytes:
+        """Return the stored point."""
+        return POINT_STRUCT.pack(timestamp, price, NO_DISCOUNT if discount is None else discount)
+
+    def __len__(self) -> int:
+        """Return the number of points."""
+        return len(self.times)
+
+    def append(self, timestamp: float, price: float, discount: int | None) -> bool:
+        """Add a point if the price or discount changed and return True if it was added."""
+        stored_discount = NO_DISCOUNT if discount is None else discount
+        stored_price = array("f", [price])[0]  # Rounded like the stored prices
+        if self.times and self.prices[-1] == stored_price and self.discounts[-1] == stored_discount:
+            return False
+        self.times.append(timestamp)
+        self.prices.append(price)
+        self.discounts.append(stored_discount)
+        return True
+
+    def _point(self, index: int) -> PricePoint:
+        discount = self.discounts[index]
+        return PricePoint(self.times[index], round(self.prices[index], 2), None if discount == NO_DISCOUNT else discount)
+
+    def low(self) -> PricePoint | None:
+        """Return the latest point with the lowest price."""
+        if not self.times:
+            return
+        low_price = min(self.prices)
+        for index in range(len(self.prices) - 1, -1, -1):
+            if self.prices[index] == low_price:
+                return self._point(index)
+
+    def to_json(self) -> dict:
+        """Return the series as columns and its low."""
+        low = self.low()
+        return {
+            "times": self.times.tolist(),
+            "prices": [round(price, 2) for price in self.prices],
+            "discounts": [None if discount == NO_DISCOUNT else discount for discount in self.discounts],
+            "low": None if low is None else low._asdict()
+        }
+
+
+class PriceHistory:
+    """Collect every observed price in the shared backend (one log per app and source, other workers append to it as well)."""
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}price_history{ANSICodes.RESET}")
+        self._lock = asyncio.Lock()  # Checking for a change reads the series, so this worker doesn't append the same point twice
+
+    async def get(self, appid: int, source: str) -> PriceSeries:
+        """Get the series for the app and source (empty if no price was observed yet)."""
+        return PriceSeries.from_entries(await backend.get_log(f"price_history:{appid}:{source}"))
+
+    async def add(self, appid: int, source: str, price: float | None, discount: int | None = None) -> None:
+        """Add an observed price (free apps and missing prices are ignored)."""
+        if price is None or price <= 0:
+            return
+        try:
+            async with self._lock:
+                series = await self.get(appid, source)
+                timestamp = time.time()
+                if series.append(timestamp, price, discount):
+                    await backend.append_log(f"price_history:{appid}:{source}", PriceSeries.to_entry(timestamp, price, discount))
+                    self.logger.debug(f"Added {source} price {price} for {appid} ({len(series)} points)")
+        except Exception as e:  # noqa: BLE001
+            self.logger.error(f"Could not add {source} price for {appid}: {e.__class__.__name__}: {e}")
+
+
+price_history = PriceHistory()
@@ -0,0 +1,63 @@
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+SAMPLE_INTERVAL = 0.002  # Seconds between two samples of all threads
+MAX_DURATION = 60  # Seconds a profile runs at most
+MAX_STACK_DEPTH = 128  # Frames of a sample, the outermost frames of deeper stacks are dropped
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads of the process in a separate thread.
+
+    The samples include time the event loop waits for the network (in the selector), so CPU work and waiting can be compared.
+    Other requests running at the same time are sampled as well.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, max_duration: float = MAX_DURATION) -> None:
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks: Counter[str] = Counter()  # Folded stack (root first, separated by ";") -> samples
+        self.sample_count = 0
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def _sample(self) -> None:
+        start_time = time.perf_counter()
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < MAX_STACK_DEPTH:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                names.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(names))] += 1
+            self.sample_count += 1
+            self.duration = time.perf_counter() - start_time
+            if self.duration >= self.max_duration:
+                break
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the last sample."""
+        self._stop_event.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Return the samples in the folded format of flamegraph.pl (also read by speedscope), one stack per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
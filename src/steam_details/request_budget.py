@@ -0,0 +1,48 @@
+from contextvars import ContextVar
+
+import httpx
+
+
+class RequestBudgetExhaustedError(Exception):
+    """The lookup made all upstream requests its service allows, it can be retried later."""
+
+
+class RequestBudget:
+    """Upstream requests a single service call may make."""
+
+    __slots__ = ("limit", "count")
+
+    def __init__(self, limit: int | None) -> None:
+        self.limit = limit  # None for no limit
+        self.count = 0  # Requests that reached the network (or the browser)
+
+    def spend(self) -> None:
+        """Count a request or raise RequestBudgetExhaustedError if there is none left."""
+        if self.limit is not None and self.count >= self.limit:
+            raise RequestBudgetExhaustedError(f"Used all {self.limit} upstream requests of the lookup")
+        self.count += 1
+
+
+# Budget of the service call in the current context (None outside of calls, like loading a service)
+current_budget: ContextVar[RequestBudget | None] = ContextVar("current_budget", default=None)
+
+
+def spend_request() -> None:
+    """Count a request against the budget of the current call (for requests that don't use the http client)."""
+    budget = current_budget.get()
+    if budget is not None:
+        budget.spend()
+
+
+class BudgetTransport(httpx.AsyncBaseTransport):
+    """Count every request against the budget of the current call before it is sent."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:  # noqa: D102
+        spend_request()
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:  # noqa: D102
+        await self.transport.aclose()
@@ -0,0 +1,104 @@
+import asyncio
+import itertools
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # A user waits for the result
+    BATCH = 1  # Many games at once, e.g. a wishlist
+    BACKGROUND = 2  # Nobody waits, e.g. refreshing stale details
+
+
+# Seconds a waiter of the class is ranked behind an interactive waiter, so waiting longer than this lets it go first (aging)
+AGING_DELAYS = {
+    Priority.INTERACTIVE: 0.0,
+    Priority.BATCH: 5.0,
+    Priority.BACKGROUND: 30.0
+}
+
+# Priority of the calls started in the current context (tasks inherit it from the code that created them)
+current_priority: ContextVar[Priority] = ContextVar("current_priority", default=Priority.INTERACTIVE)
+
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "sequence", "future")
+
+    def __init__(self, priority: Priority, sequence: int) -> None:
+        self.priority = priority
+        self.deadline = time.monotonic() + AGING_DELAYS[priority]
+        self.sequence = sequence
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+
+class PriorityScheduler:
+    """
+    Limit the concurrent calls of a service and hand out free slots by priority.
+
+    Waiters are served earliest deadline first, the deadline is the time they started waiting plus the aging delay of their class.
+    Interactive calls go first, but batch and background calls that waited long enough are not starved.
+    The reserved slots are only used by interactive calls, so they don't wait for a running batch at all.
+    """
+
+    def __init__(self, slots: int, reserved_slots: int = 0) -> None:
+        self.slots = slots
+        self.reserved_slots = reserved_slots
+        self.running = 0
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+
+    def _can_run(self, priority: Priority) -> bool:
+        if priority is Priority.INTERACTIVE:
+            return self.running < self.slots
+        return self.running < self.slots - self.reserved_slots
+
+    def _wake(self) -> None:
+        while True:
+            runnable = [waiter for waiter in self._waiters if self._can_run(waiter.priority)]
+            if not runnable:
+                return
+            waiter = min(runnable, key=lambda waiter: (waiter.deadline, waiter.sequence))
+            self._waiters.remove(waiter)
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def waiting(self) -> dict[str, int]:
+        """Return the number of waiters per priority."""
+        counts = {priority.name.lower(): 0 for priority in Priority}
+        for waiter in self._waiters:
+            counts[waiter.priority.name.lower()] += 1
+        return counts
+
+    async def acquire(self, priority: Priority) -> None:
+        """Wait for a free slot."""
+        if self._can_run(priority):  # Waiters that could run were already woken up
+            self.running += 1
+            return
+
+        waiter = _Waiter(priority, next(self._sequence))
+        self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():  # Got the slot while it was cancelled
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        """Free a slot and give it to the next waiter."""
+        self.running -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        """Hold a slot while the context is active."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
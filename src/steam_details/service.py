@@ -1,30 +1,90 @@
 import asyncio
 import logging
+import os
 import time
 import traceback
+from contextvars import ContextVar
 
 from httpx import ReadTimeout
 from pydantic import BaseModel
 
+from .backend import backend
+from .request_budget import RequestBudget, RequestBudgetExhaustedError, current_budget
+from .scheduler import PriorityScheduler, current_priority
+from .tracing import tracer
+
+
+class ServiceCall:
+    """State of a single call of a service, so calls can overlap."""
+
+    __slots__ = ("service_name", "error_url", "priority", "budget", "cache_negative_result", "start_time", "wait_time", "run_time", "task")
+
+    def __init__(self, service_name: str, error_url: str, request_budget: int | None) -> None:
+        self.service_name = service_name
+        self.error_url = error_url  # Shown if the call fails, services can replace it with a more specific URL
+        self.budget = RequestBudget(request_budget)  # Also counts the upstream requests of the call
+        self.priority = current_priority.get()
+        self.cache_negative_result = True  # Whether no result means the game isn't known to the service
+        self.start_time = time.time()
+        self.wait_time: float | None = None  # Until a slot of the service was free
+        self.run_time: float | None = None
+        self.task: asyncio.Task[BaseModel | None] | None = None
+
+
+def get_service_limit(variable: str, name: str, default: int | None) -> int | None:
+    """Return the limit of the service from the environment variable (like "SteamDB=1,ProtonDB=8") or the default."""
+    for item in os.environ.get(variable, "").split(","):
+        item_name, _, value = item.partition("=")
+        if item_name.strip().lower() == name.lower() and value.strip().isdigit() and int(value) > 0:
+            return int(value)
+    return default
+
+
+def get_max_concurrency(name: str, default: int) -> int:
+    """Return the concurrency of the service from STEAM_DETAILS_CONCURRENCY or the default."""
+    return get_service_limit("STEAM_DETAILS_CONCURRENCY", name, default)
+
+
+def get_request_budget(name: str, default: int | None) -> int | None:
+    """Return the upstream requests per call of the service from STEAM_DETAILS_REQUEST_BUDGET or the default."""
+    return get_service_limit("STEAM_DETAILS_REQUEST_BUDGET", name, default)
+
+
+current_call: ContextVar[ServiceCall] = ContextVar("current_call")  # Set in the task of the call
+
 
 class Service:
     """Base class for all services."""
 
-    def __init__(self, name: str, log_name: str, default_error_url: str) -> None:
+    def __init__(
+        self,
+        name: str,
+        log_name: str,
+        default_error_url: str,
+        negative_result_ttl: float | None = None,
+        max_concurrency: int = 1,
+        request_budget: int | None = None
+    ) -> None:
         # Logging
         self.logger = logging.getLogger(log_name)
         self.name = name
 
+        # Calls running at the same time, the others wait for a free slot (one is kept free for interactive calls if possible)
+        self.max_concurrency = get_max_concurrency(name, max_concurrency)
+        self.scheduler = PriorityScheduler(self.max_concurrency, reserved_slots=1 if self.max_concurrency > 1 else 0)
+
+        # Upstream requests a single call may make (None for no limit), so one game can't use up the rate limit of the upstream
+        self.request_budget = get_request_budget(name, request_budget)
+
         # Error handling
-        self._lock = asyncio.Lock()
         self.default_error_url: str = default_error_url
-        self.error_url: str | None = None  # Only set in self._lock
 
-        # Stats
+        # Remember games the service found nothing for (None disables it)
+        self.negative_result_ttl = negative_result_ttl
+
+        # Stats (the speed history and counts are kept in the shared backend)
         self.load_time: float | None = None
-        self.speed_history: list[float] = []
-        self.timeout_count: int = 0
-        self.error_count: int = 0
+        self._load_lock = asyncio.Lock()  # Calls that find the service unloaded wait for a single load
 
         self.logger.debug(f"Initialized {self.name}")
 
@@ -36,45 +96,88 @@ class Service:
         """Get the details of the game. You should override this."""
         raise NotImplementedError
 
-    async def _get_game_details_task(self, **kwargs) -> BaseModel:
+    def get_negative_result_key(self, **kwargs) -> str:
+        """Return the key for negative results of a call. You can override this."""
+        if "steam" in kwargs:
+            return str(kwargs["steam"].appid)
+        return str(kwargs["appid"])
+
+    def set_error_url(self, error_url: str) -> None:
+        """Replace the error URL of the current call (e.g. once the page of the game is known)."""
+        current_call.get().error_url = error_url
+
+    def skip_negative_result(self) -> None:
+        """Don't cache the missing result of the current call (e.g. the game is known but has nothing to show right now)."""
+        current_call.get().cache_negative_result = False
+
+    async def _get_game_details_task(self, call: ServiceCall, **kwargs) -> BaseModel | None:
         """Get the details of the game."""
-        async with self._lock:
-            self.logger.debug(f"Starting task {self.name}")
-            start_time = time.time()
-            self.error_url = self.default_error_url.format(**kwargs)
-            try:
-                await self.load_check()
-                response = await self.get_game_details(**kwargs)
-            except ReadTimeout as e:
-                self.timeout_count += 1
-                self.logger.error(f"Timeout on {self.name}")
-                raise e
-            except Exception as e:
-                self.error_count += 1
-                self.logger.error(f"Error on {self.name}: {e.__class__.__name__}: {e}")
-                raise e
-            else:
-                run_time = time.time() - start_time
-                self.logger.debug(f"Got response in {run_time:.2f}s")
-                self.speed_history.append(run_time)
-                return response
+        current_call.set(call)
+        current_budget.set(call.budget)
+
+        with tracer.span(self.name, service=self.name, priority=call.priority.name.lower()) as span:
+            if self.negative_result_ttl is not None:
+                negative_result_key = self.get_negative_result_key(**kwargs)
+                if await backend.has_negative_result(self.name, negative_result_key):
+                    self.logger.info(f"Skipping {self.name} for {negative_result_key}, nothing was found recently")
+                    span.attributes["negative_result"] = True
+                    return
+
+            async with self.scheduler.slot(call.priority):
+                call.wait_time = time.time() - call.start_time
+                span.attributes["wait_time_ms"] = round(call.wait_time * 1000, 3)
+                self.logger.debug(f"Starting {call.priority.name.lower()} task {self.name} (waited {call.wait_time:.2f}s)")
+                start_time = time.time()
+                try:
+                    await self.load_check()
+                    response = await self.get_game_details(**kwargs)
+                except RequestBudgetExhaustedError as e:
+                    self.logger.warning(f"Request budget of {self.name} exhausted after {call.budget.count} requests")
+                    await backend.increment_count(self.name, "budget_exhausted_count")
+                    raise e
+                except ReadTimeout as e:
+                    self.logger.error(f"Timeout on {self.name}")
+                    await backend.increment_count(self.name, "timeout_count")
+                    raise e
+                except Exception as e:
+                    self.logger.error(f"Error on {self.name}: {e.__class__.__name__}: {e}")
+                    await backend.increment_count(self.name, "error_count")
+                    raise e
+                else:
+                    call.run_time = time.time() - start_time
+                    self.logger.debug(f"Got response in {call.run_time:.2f}s")
+                    await backend.add_speed(self.name, call.run_time)
+                    if response is None and self.negative_result_ttl is not None and call.cache_negative_result:
+                        await backend.set_negative_result(self.name, negative_result_key, self.negative_result_ttl)
+                    return response
+                finally:
+                    span.attributes["requests"] = call.budget.count
+                    await backend.increment_count(self.name, "lookup_count")
+                    await backend.increment_count(self.name, "request_count", call.budget.count)
 
     async def load_service(self) -> None:
         """Load the service."""
         if self.load_time is not None:  # Already loaded
             return
 
-        self.logger.debug(f"Loading {self.name}")
-        start_time = time.time()
+        async with self._load_lock:
+            if self.load_time is not None:  # Loaded while waiting for the lock
+                return
 
-        try:
-            await self.load()
-        except Exception as e:  # noqa: BLE001
-            self.logger.error(f"Error loading {self.name}: {e.__class__.__name__}: {e}")
-            traceback.print_exc()
-        else:
-            self.load_time = time.time() - start_time
-            self.logger.debug(f"Loaded {self.name} in {self.load_time:.2f}s")
+            self.logger.debug(f"Loading {self.name}")
+            start_time = time.time()
+
+            token = current_budget.set(None)  # Loading is shared by all calls, it doesn't count against the call that triggered it
+            try:
+                await self.load()
+            except Exception as e:  # noqa: BLE001
+                self.logger.error(f"Error loading {self.name}: {e.__class__.__name__}: {e}")
+                traceback.print_exc()
+            else:
+                self.load_time = time.time() - start_time
+                self.logger.debug(f"Loaded {self.name} in {self.load_time:.2f}s")
+            finally:
+                current_budget.reset(token)
 
     async def load_check(self) -> None:
         """Check if the service is loaded and try to load it if not."""
@@ -84,6 +187,12 @@ class Service:
             if self.load_time is None:
                 raise RuntimeError("Service failed to load")
 
-    def create_task(self, **kwargs) -> asyncio.Task[BaseModel]:
+    def start_call(self, **kwargs) -> ServiceCall:
+        """Start a task for the service to get the details of the game and return its call."""
+        call = ServiceCall(self.name, self.default_error_url.format(**kwargs), self.request_budget)
+        call.task = asyncio.create_task(self._get_game_details_task(call, **kwargs))
+        return call
+
+    def create_task(self, **kwargs) -> asyncio.Task[BaseModel | None]:
         """Create a task for the service to get the details of the game."""
-        return asyncio.create_task(self._get_game_details_task(**kwargs))
+        return self.start_call(**kwargs).task
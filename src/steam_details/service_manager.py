@@ -1,7 +1,14 @@
 import base64
+import bisect
 import logging
 
+import orjson
+from typing_extensions import TypedDict
+
 from .analytics import Analytics, AnalyticsService, render_speed_box_plot
+from .app_index import Candidate
+from .backend import backend
+from .loop_monitor import loop_monitor
 from .service import Service
 from .services.how_long_to_beat import HowLongToBeat
 from .services.keyforsteam import KeyForSteam
@@ -11,6 +18,44 @@ from .services.steamdb import SteamDB
 from .utils import ANSICodes
 
 
+class WishlistChanges(TypedDict):
+    appids: list[int]  # The whole wishlist, sorted by priority
+    added: list[int]
+    removed: list[int]
+    reprioritized: list[int]  # Kept games that moved, the fewest games whose move explains the new order of the kept games
+
+
+def get_moved_appids(appids: list[int], previous_appids: list[int]) -> list[int]:
+    """
+    Return the fewest games that have to move to turn the previous order into the new one (both with the same games).
+
+    The other games keep their relative order, they are the longest increasing subsequence of the previous positions.
+    """
+    previous_positions = {appid: position for position, appid in enumerate(previous_appids)}
+    positions = [previous_positions[appid] for appid in appids]
+
+    # Patience sorting, tails[length - 1] is the index of the smallest last position of an increasing subsequence of that length
+    tails: list[int] = []
+    tail_positions: list[int] = []
+    predecessors: list[int | None] = []
+    for index, position in enumerate(positions):
+        length = bisect.bisect_left(tail_positions, position)
+        predecessors.append(tails[length - 1] if length > 0 else None)
+        if length == len(tails):
+            tails.append(index)
+            tail_positions.append(position)
+        else:
+            tails[length] = index
+            tail_positions[length] = position
+
+    in_order: set[int] = set()
+    index = tails[-1] if tails else None
+    while index is not None:
+        in_order.add(index)
+        index = predecessors[index]
+    return [appid for index, appid in enumerate(appids) if index not in in_order]
+
+
 class ServiceManager:
     def __init__(self):
         self._logger = logging.getLogger(f"{ANSICodes.MAGENTA}service_manager{ANSICodes.RESET}")
@@ -42,10 +87,54 @@ class ServiceManager:
         """Get the app id for the given name using the steam app list."""
         return await self.steam.get_app(name)
 
+    async def search_apps(self, query: str, limit: int = 10) -> list[Candidate]:
+        """Search apps by name for the typeahead."""
+        return await self.steam.search_apps(query, limit)
+
     async def get_wishlist(self, profile_name_or_id: str) -> list[int] | None:
         """Get the wishlist data for the given profile name or id."""
         return await self.steam.get_wishlist_data(profile_name_or_id)
 
+    async def get_wishlist_snapshot(self, profile_name_or_id: str) -> list[int] | None:
+        """Get the wishlist as it was on its last request (None if it wasn't requested yet)."""
+        blob = await backend.get_blob(f"wishlist:{profile_name_or_id.lower()}")
+        if blob is None:
+            return
+        return orjson.loads(blob[1])
+
+    async def get_wishlist_changes(self, profile_name_or_id: str) -> WishlistChanges | None:
+        """
+        Get the wishlist and its changes since the last snapshot of this profile.
+
+        The snapshot is shared by all clients, so clients compare the wishlist with what they display themselves.
+        The first time every game is added.
+        """
+        appids = await self.get_wishlist(profile_name_or_id)
+        if appids is None:
+            return
+
+        key = f"wishlist:{profile_name_or_id.lower()}"
+        blob = await backend.get_blob(key)
+        previous_appids: list[int] = [] if blob is None else orjson.loads(blob[1])
+        await backend.set_blob(key, orjson.dumps(appids))
+
+        appid_set = set(appids)
+        previous_appid_set = set(previous_appids)
+        changes = WishlistChanges(
+            appids=appids,
+            added=[appid for appid in appids if appid not in previous_appid_set],
+            removed=[appid for appid in previous_appids if appid not in appid_set],
+            reprioritized=get_moved_appids(
+                [appid for appid in appids if appid in previous_appid_set],
+                [appid for appid in previous_appids if appid in appid_set]
+            )
+        )
+        self._logger.info(
+            f"Wishlist {repr(profile_name_or_id)}: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+            f"{len(changes['reprioritized'])} reprioritized"
+        )
+        return changes
+
     async def analyze_services(self) -> Analytics | None:
         """
         Analyze all services and return their data.
@@ -60,13 +149,21 @@ class ServiceManager:
                 load_time = None
             else:
                 load_time = round(service.load_time, 3)
+            stats = await backend.get_service_stats(service.name)
             services.append(AnalyticsService(
                 name=service.name,
                 load_time=load_time,
-                timeout_count=service.timeout_count,
-                error_count=service.error_count
+                timeout_count=stats.timeout_count,
+                error_count=stats.error_count,
+                request_budget=service.request_budget,
+                requests_per_lookup=round(stats.request_count / stats.lookup_count, 2) if stats.lookup_count else None,
+                budget_exhausted_count=stats.budget_exhausted_count,
+                tier_counts=stats.tier_counts,
+                max_concurrency=service.max_concurrency,
+                running=service.scheduler.running,
+                waiting=service.scheduler.waiting()
             ))
-            speed_histories[service.name] = service.speed_history
+            speed_histories[service.name] = stats.speed_history
 
         # Return if no data
         if not services:
@@ -82,7 +179,8 @@ class ServiceManager:
         # Return data
         return Analytics(
             services=services,
-            speed_box_plot=speed_box_plot_base64
+            speed_box_plot=speed_box_plot_base64,
+            loop_lag=loop_monitor.get_lag()
         )
 
 
@@ -11,6 +11,10 @@ from ..service import Service
 from ..services.steam import SteamDetails
 from ..utils import http_client
 
+NEGATIVE_RESULT_TTL = 60 * 60 * 24 * 3  # Games that aren't listed on HowLongToBeat are looked up again after this many seconds
+MAX_CONCURRENCY = 2  # Concurrent HowLongToBeat searches
+REQUEST_BUDGET = 11  # Upstream requests per lookup (the search and the props of up to 10 candidates)
+
 
 class HowLongToBeatDetails(BaseModel):
     main: int | None
@@ -21,7 +25,7 @@ class HowLongToBeatDetails(BaseModel):
 
 class HowLongToBeat(Service):
     def __init__(self, name: str, log_name: str) -> None:
-        super().__init__(name, log_name, "https://howlongtobeat.com")
+        super().__init__(name, log_name, "https://howlongtobeat.com", negative_result_ttl=NEGATIVE_RESULT_TTL, max_concurrency=MAX_CONCURRENCY, request_budget=REQUEST_BUDGET)
 
         # Cache
         self._search_endpoint: str | None = None
@@ -209,7 +213,7 @@ class HowLongToBeat(Service):
 
             if current_appid == steam.appid:
                 self.logger.info(f"Found {repr(steam.name)}")
-                self.error_url = f"https://howlongtobeat.com/game/{game_data['game_id']}"
+                self.set_error_url(f"https://howlongtobeat.com/game/{game_data['game_id']}")
                 return HowLongToBeatDetails(
                     main=game_data["comp_main"] if game_data["comp_main"] != 0 else None,
                     plus=game_data["comp_plus"] if game_data["comp_plus"] != 0 else None,
@@ -2,16 +2,23 @@ import json
 import re
 import unicodedata
 from datetime import datetime
+from typing import NamedTuple
 from urllib.parse import quote
 
 from bs4 import BeautifulSoup
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 
+from ..cpu_pool import cpu_pool
+from ..price_history import price_history
 from ..service import Service
 from ..services.steam import SteamDetails
 from ..utils import http_client, price_string_to_float, roman_string_to_int_string
 
+NEGATIVE_RESULT_TTL = 60 * 60 * 12  # Games without a KeyForSteam product are looked up again after this many seconds
+MAX_CONCURRENCY = 2  # Concurrent KeyForSteam lookups (several pages each)
+REQUEST_BUDGET = 8  # Upstream requests per lookup (the game page, the search and two requests per candidate)
+
 PLATFORMS = [
     "PlayStation 4",
     "PlayStation4",
@@ -209,8 +216,58 @@ IGNORED_WORDS = [
 
 IGNORED_CHARS = [":", "™", "-", "(", ")", "[", "]", "{", "}", "/", ",", "©", "®"]
 
+IGNORED_WORD_LIST = IGNORED_WORDS + PLATFORMS + [f"{adjective} {platform}" for platform in PLATFORMS for adjective in ADJECTIVES]
+
+
+def normalize_string(input_str: str) -> str:
+    """Remove accents and other non-ASCII characters."""
+    return (
+        unicodedata.normalize("NFD", input_str)
+        .encode("ascii", "ignore")
+        .decode("utf-8")
+    )
+
+
+# Compiled once per process instead of looking up hundreds of patterns in the cache of re for every name
+_IGNORED_WORD_PATTERNS = [re.compile(r"\b" + re.escape(normalize_string(word).replace("’", "'")) + r"\b") for word in IGNORED_WORD_LIST]
+_IGNORED_CHAR_PATTERNS = [re.compile(re.escape(char.lower())) for char in IGNORED_CHARS]
+
+
+def purge_name(name: str) -> str:
+    """
+    Purge a game name (runs in the CPU pool).
+
+    This function is based on the allkeyshop add-on:
+
+    https://addons.mozilla.org/en-US/firefox/addon/allkeyshop-compare-game-prices/ - version 3.0.10413
+    """
+    name = normalize_string(roman_string_to_int_string(name).lower()).replace("&#39;", "'")
+    for pattern in _IGNORED_WORD_PATTERNS:
+        name = pattern.sub("", name)
+    for pattern in _IGNORED_CHAR_PATTERNS:
+        name = pattern.sub(" ", name)
+    for pattern in _IGNORED_WORD_PATTERNS:
+        name = pattern.sub("", name)
+    return re.sub(r"\s\s+", " ", name).strip()
+
 
-class Offer(BaseModel):
+def parse_game_page(content: str) -> tuple[int | None, str | None]:
+    """Return the internal ID and name in a game page, None if they weren't found (runs in the CPU pool)."""
+    soup = BeautifulSoup(content, "html.parser")
+
+    internal_id = None
+    for script_tag in soup.find_all("script"):
+        if script_tag.text.startswith('var game_id="') and script_tag.text.endswith('"'):
+            internal_id = int(script_tag.text.split('var game_id="')[-1].split('"')[0])
+            break
+
+    span_tag = soup.find("span", {"data-itemprop": "name"})
+    internal_name = None if span_tag is None else span_tag.text.strip()
+
+    return internal_id, internal_name
+
+
+class Offer(NamedTuple):  # Not a pydantic model, there can be hundreds of offers per product
     id: int
     is_available: bool
 
@@ -249,52 +306,7 @@ class KeyForSteamDetails(BaseModel):
 
 class KeyForSteam(Service):
     def __init__(self, name: str, log_name: str) -> None:
-        super().__init__(name, log_name, "https://www.keyforsteam.de")
-
-        # Get full ignored word list
-        self._ignored_word_list = IGNORED_WORDS + PLATFORMS
-        for platform in PLATFORMS:
-            for adjective in ADJECTIVES:
-                self._ignored_word_list.append(f"{adjective} {platform}")
-
-    def _normalize_string(self, input_str: str) -> str:
-        return (
-            unicodedata.normalize("NFD", input_str)
-            .encode("ascii", "ignore")
-            .decode("utf-8")
-        )
-
-    def _purge_words(self, name: str, words: list[str]) -> str:
-        for word in words:
-            name = re.sub(
-                r"\b" + re.escape(self._normalize_string(word).replace("’", "'")) + r"\b",
-                "",
-                name,
-            )
-        return name
-
-    def _purge_chars(self, name: str, chars: list[str]) -> str:
-        for char in chars:
-            name = re.sub(re.escape(char.lower()), " ", name)
-        return name
-
-    def _purge_name(self, name: str) -> str:
-        """
-        Purges a game name.
-
-        This function is based on the allkeyshop add-on:
-
-        https://addons.mozilla.org/en-US/firefox/addon/allkeyshop-compare-game-prices/ - version 3.0.10413
-        """
-        purged_name = re.sub(r"\s\s+", " ", self._purge_words(
-            self._purge_chars(self._purge_words(
-                self._normalize_string(roman_string_to_int_string(name).lower()).replace("&#39;", "'"),
-                self._ignored_word_list
-            ), IGNORED_CHARS),
-            self._ignored_word_list
-        )).strip()
-        self.logger.debug(f"Purged name {repr(name)} -> {repr(purged_name)}")
-        return purged_name
+        super().__init__(name, log_name, "https://www.keyforsteam.de", negative_result_ttl=NEGATIVE_RESULT_TTL, max_concurrency=MAX_CONCURRENCY, request_budget=REQUEST_BUDGET)
 
     async def _get_internal_id_and_name(self, keyforsteam_game_url: str) -> tuple[int | None, str | None]:
         """Return a tuple of the internal ID and name of the game on KeyForSteam or (None, None) if the game page doesn't exist."""
@@ -305,39 +317,71 @@ class KeyForSteam(Service):
         if r.status_code == 404:
             return None, None
         r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        # Get internal ID
-        internal_id = None
-        for script_tag in soup.find_all("script"):
-            if script_tag.text.startswith('var game_id="') and script_tag.text.endswith('"'):
-                internal_id = int(script_tag.text.split('var game_id="')[-1].split('"')[0])
-                self.logger.info(f"Internal KeyForSteam ID: {internal_id}")
-                break
-            else:
-                self.logger.debug(f"Skipping script tag: {repr(script_tag)}")
+        internal_id, internal_name = await cpu_pool.run(parse_game_page, r.text)
+
         if internal_id is None:
             raise Exception(f"Could not find KeyForSteam ID in {repr(keyforsteam_game_url)}")
-
-        # Get internal name
-        span_tag = soup.find("span", {"data-itemprop": "name"})
-        if span_tag is None:
+        self.logger.info(f"Internal KeyForSteam ID: {internal_id}")
+        if internal_name is None:
             raise Exception(f"Could not find internal name in {repr(keyforsteam_game_url)}")
-        internal_name = span_tag.text.strip()
         self.logger.info(f"Internal name: {repr(internal_name)}")
 
         return internal_id, internal_name
 
+    def _evaluate_offers(self, offers_data: dict) -> tuple[Offer | None, Offer | None]:
+        """Return the steam offer and the cheapest available offer."""
+        regions = offers_data["regions"]
+        merchants = offers_data["merchants"]
+        editions = offers_data["editions"]
+        steam_offer: Offer | None = None
+        cheapest_offer: Offer | None = None
+        for offer_data in offers_data["offers"]:
+            seller = merchants[str(offer_data["merchant"])]["name"]
+
+            if seller == "Steam":  # Get steam offer
+                steam_offer = Offer(
+                    id=offer_data["id"],
+                    is_available=offer_data["isActive"] and offer_data["stock"] == "InStock",
+                    price=round(offer_data["price"]["eur"]["priceCard"], 2),
+                    form=regions[offer_data["region"]]["name"],
+                    seller=seller,
+                    edition=editions[offer_data["edition"]]["name"]
+                )
+                self.logger.debug(f"Found steam offer: {steam_offer}")
+                continue
+
+            # Get cheapest offer
+            if not offer_data["isActive"] or offer_data["stock"] != "InStock":
+                continue
+            price = round(offer_data["price"]["eur"]["priceCard"], 2)
+            if cheapest_offer is not None and price >= cheapest_offer.price:
+                continue
+            form = regions[offer_data["region"]]["name"]
+            if "ACCOUNT" in form or "ONLY" in form or "AUF" in form:
+                continue
+            cheapest_offer = Offer(
+                id=offer_data["id"],
+                is_available=True,
+                price=price,
+                form=form,
+                seller=seller,
+                edition=editions[offer_data["edition"]]["name"]
+            )
+            self.logger.debug(f"Found cheaper offer: {cheapest_offer}")
+
+        return steam_offer, cheapest_offer
+
     async def _get_product(
         self,
         steam: SteamDetails,
+        purged_name: str,
         internal_id: int,
         internal_name: str,
         keyforsteam_game_url: str
     ) -> Product | None:
-        """Return product details for the given internal ID, or None if the game isn't available."""
+        """Return product details for the given internal ID (purged_name is the purged steam name), or None if the game isn't available."""
         # Verify name
-        if self._purge_name(steam.name) != self._purge_name(internal_name):
+        if purged_name != await cpu_pool.run(purge_name, internal_name):
             self.logger.debug(f"Skipping KeyForSteam ID {internal_id} due to name mismatch: {repr(steam.name)} != {repr(internal_name)}")
             return
 
@@ -372,33 +416,7 @@ class KeyForSteam(Service):
             raise Exception("KeyForSteam API error")
 
         # Evaluate offers
-        steam_offer: Offer | None = None
-        cheapest_offer: Offer | None = None
-        for offer_data in offers_data["offers"]:
-            offer = Offer(
-                id=offer_data["id"],
-                is_available=offer_data["isActive"] and offer_data["stock"] == "InStock",
-
-                price=round(offer_data["price"]["eur"]["priceCard"], 2),
-                form=offers_data["regions"][offer_data["region"]]["name"],
-                seller=offers_data["merchants"][str(offer_data["merchant"])]["name"],
-                edition=offers_data["editions"][offer_data["edition"]]["name"]
-            )
-            self.logger.debug(f"Offer: {offer}")
-
-            if offer.seller == "Steam":  # Get steam offer
-                self.logger.debug(f"Found steam offer: {offer}")
-                steam_offer = offer
-
-            elif all((  # Get cheapest offer
-                offer.is_available,
-                "ACCOUNT" not in offer.form,
-                "ONLY" not in offer.form,
-                "AUF" not in offer.form,
-                cheapest_offer is None or offer.price < cheapest_offer.price
-            )):
-                self.logger.debug(f"Found cheaper offer: {offer}")
-                cheapest_offer = offer
+        steam_offer, cheapest_offer = self._evaluate_offers(offers_data)
 
         # Check if steam offer is available
         if steam_offer is not None:
@@ -444,13 +462,17 @@ class KeyForSteam(Service):
 
         products: list[Product] = []
 
+        purged_name = await cpu_pool.run(purge_name, steam.name)
+        self.logger.debug(f"Purged name {repr(steam.name)} -> {repr(purged_name)}")
+
         # Get internal ID and link directly
-        keyforsteam_game_url = f"https://www.keyforsteam.de/{'-'.join(self._purge_name(steam.name).split(' '))}-key-kaufen-preisvergleich/"
+        keyforsteam_game_url = f"https://www.keyforsteam.de/{'-'.join(purged_name.split(' '))}-key-kaufen-preisvergleich/"
         direct_internal_id, internal_name = await self._get_internal_id_and_name(keyforsteam_game_url)
 
         if direct_internal_id is not None:
             product = await self._get_product(
                 steam=steam,
+                purged_name=purged_name,
                 internal_id=direct_internal_id,
                 internal_name=internal_name,
                 keyforsteam_game_url=keyforsteam_game_url
@@ -463,8 +485,6 @@ class KeyForSteam(Service):
             # Get internal ID and link via search
             self.logger.info("Couldn't get internal ID, trying search")
 
-            purged_name = self._purge_name(steam.name)
-
             # Search for game
             r = await http_client.get(
                 "https://www.allkeyshop.com/api/latest/vaks.php",
@@ -514,6 +534,7 @@ class KeyForSteam(Service):
                 # Get product
                 product = await self._get_product(
                     steam=steam,
+                    purged_name=purged_name,
                     internal_id=product_data["id"],
                     internal_name=product_data["name"],
                     keyforsteam_game_url=product_data["link"]
@@ -534,13 +555,17 @@ class KeyForSteam(Service):
             raise Exception(f"Too many KeyForSteam products found: Found {len(products)}")
 
         product = products[0]
-        self.error_url = product.keyforsteam_game_url
+        self.set_error_url(product.keyforsteam_game_url)
         self.logger.info(f"Found KeyForSteam product: {product}")
 
         if product.cheapest_offer is None:
             self.logger.info("No cheapest offer found")
+            self.skip_negative_result()  # Listed, offers can show up at any time
             return
 
+        # Remember the observed price
+        await price_history.add(steam.appid, "keyforsteam", product.cheapest_offer["price"])
+
         # Get price history
         self.logger.info(f"Getting price history for internal id {product.internal_id}")
         r = await http_client.get(
@@ -4,6 +4,10 @@ from ..service import Service
 from ..services.steam import SteamDetails
 from ..utils import http_client
 
+NEGATIVE_RESULT_TTL = 60 * 60 * 24  # Apps without ProtonDB reports are looked up again after this many seconds
+MAX_CONCURRENCY = 8  # Concurrent ProtonDB summaries (a small JSON file each)
+REQUEST_BUDGET = 2  # Upstream requests per lookup
+
 
 class ProtonDBDetails(BaseModel):
     tier: str
@@ -14,7 +18,7 @@ class ProtonDBDetails(BaseModel):
 
 class ProtonDB(Service):
     def __init__(self, name: str, log_name: str) -> None:
-        super().__init__(name, log_name, "https://www.protondb.com/app/{steam.appid}")
+        super().__init__(name, log_name, "https://www.protondb.com/app/{steam.appid}", negative_result_ttl=NEGATIVE_RESULT_TTL, max_concurrency=MAX_CONCURRENCY, request_budget=REQUEST_BUDGET)
 
     async def get_game_details(self, steam: SteamDetails) -> ProtonDBDetails | None:
         """Get linux support state from ProtonDB."""
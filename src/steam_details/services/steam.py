@@ -1,10 +1,27 @@
+import asyncio
+import time
 from datetime import datetime
 
+import orjson
 from pydantic import BaseModel
 
+from ..app_index import AppIndex, Candidate
+from ..backend import backend
+from ..cpu_pool import cpu_pool
+from ..price_history import price_history
 from ..service import Service
 from ..utils import http_client
 
+NEGATIVE_RESULT_TTL = 60 * 60 * 6  # Unknown app ids are looked up again after this many seconds
+MAX_CONCURRENCY = 4  # Concurrent Steam store lookups (the store API is rate limited)
+REQUEST_BUDGET = 4  # Upstream requests per lookup (the app details and the reviews)
+APP_LIST_MAX_AGE = 60 * 60 * 24  # Shared app lists older than this are downloaded again
+
+
+def parse_app_list(content: bytes) -> list[tuple[int, str]]:
+    """Return the app ids and names of the app list (runs in the CPU pool)."""
+    return [(app["appid"], app["name"]) for app in orjson.loads(content)["applist"]["apps"]]
+
 
 class ReleaseDate(BaseModel):
     display_string: str
@@ -35,25 +52,30 @@ class SteamDetails(BaseModel):
 
 class Steam(Service):
     def __init__(self, name: str, log_name: str) -> None:
-        super().__init__(name, log_name, "https://store.steampowered.com/{appid}")
+        super().__init__(name, log_name, "https://store.steampowered.com/{appid}", negative_result_ttl=NEGATIVE_RESULT_TTL, max_concurrency=MAX_CONCURRENCY, request_budget=REQUEST_BUDGET)
 
-        self.app_list: dict[str, int] | None = None
+        self.app_index: AppIndex | None = None
 
     async def load(self) -> None:
-        """Get the steam app list."""
-        self.logger.info("Downloading app list")
-        r = await http_client.get("https://api.steampowered.com/ISteamApps/GetAppList/v2/", timeout=30)
-        self.logger.info(f"Response (100 chars): {repr(r.text[:100])}")
-        self.logger.debug(f"Response: (all): {r.text}")
-        r.raise_for_status()
+        """Get the steam app list (from the shared backend if another worker already downloaded it)."""
+        blob = await backend.get_blob("steam_app_list")
+        if blob is not None and time.time() - blob[0] < APP_LIST_MAX_AGE:
+            self.logger.info("Using shared app list")
+            content = blob[1]
+        else:
+            self.logger.info("Downloading app list")
+            r = await http_client.get("https://api.steampowered.com/ISteamApps/GetAppList/v2/", timeout=30)
+            self.logger.info(f"Response (100 chars): {repr(r.text[:100])}")
+            self.logger.debug(f"Response: (all): {r.text}")
+            r.raise_for_status()
+            content = r.content
+            await backend.set_blob("steam_app_list", content)
 
         self.logger.info("Processing app list")
-        j = r.json()
-        self.app_list = {}
-        for app in j["applist"]["apps"]:
-            self.app_list[app["name"].lower()] = app["appid"]
+        apps = await cpu_pool.run(parse_app_list, content)
+        self.app_index = await asyncio.to_thread(AppIndex, apps)
 
-        self.logger.info("App list ready")
+        self.logger.info(f"App list ready ({len(self.app_index)} names)")
 
     async def get_game_details(self, appid: int) -> SteamDetails | None:
         """Get details from steam for the given app id."""
@@ -98,6 +120,9 @@ class Steam(Service):
             price = None
             discount = None
 
+        # Remember the observed price
+        await price_history.add(appid, "steam", price, discount)
+
         # Get release date
         if steam_data["release_date"]["date"] == "":
             release_date = None
@@ -160,11 +185,51 @@ class Steam(Service):
             native_linux_support=steam_data["platforms"]["linux"]
         )
 
+    async def get_prices(self, appids: list[int]) -> dict[int, tuple[float, int] | None]:
+        """
+        Get only the price and discount for many apps at once.
+
+        Free apps and apps without a price are None.
+        """
+        prices: dict[int, tuple[float, int] | None] = {}
+        for i in range(0, len(appids), 100):  # The price filter allows multiple app ids per request
+            chunk = appids[i:i + 100]
+            self.logger.info(f"Getting prices for {len(chunk)} apps")
+            r = await http_client.get(
+                "https://store.steampowered.com/api/appdetails",
+                params={
+                    "appids": ",".join(str(appid) for appid in chunk),
+                    "filters": "price_overview",
+                    "cc": "de",
+                    "l": "english"
+                }
+            )
+            self.logger.info(f"Response (100 chars): {repr(r.text[:100])}")
+            self.logger.debug(f"Response: (all): {r.text}")
+            r.raise_for_status()
+            j = r.json()
+            for appid in chunk:
+                app_data = j.get(str(appid))
+                if app_data is None or app_data["success"] is False or "price_overview" not in app_data["data"]:  # data is an empty list without a price
+                    prices[appid] = None
+                    continue
+                price_overview = app_data["data"]["price_overview"]
+                if price_overview["currency"] != "EUR":
+                    raise Exception(f"Unexpected currency: {repr(price_overview['currency'])}")
+                prices[appid] = (float(price_overview["final"] / 100), price_overview["discount_percent"])
+                await price_history.add(appid, "steam", *prices[appid])
+        return prices
+
     async def get_app(self, name: str) -> int | None:
-        """Get the app id for the given name using the steam app list."""
+        """Get the app id for the given name using the steam app list (or the most similar name)."""
         self.logger.debug(f"Getting app id for {repr(name)}")
         await self.load_check()
-        return self.app_list.get(name.lower())
+        return self.app_index.resolve(name)
+
+    async def search_apps(self, query: str, limit: int) -> list[Candidate]:
+        """Search the steam app list for names similar to the query."""
+        await self.load_check()
+        return self.app_index.search(query, limit)
 
     async def get_wishlist_data(self, profile_name_or_id: str) -> list[int] | None:
         """Get the wishlist data for the given profile id."""
@@ -1,14 +1,54 @@
+import asyncio
+import fcntl
+import os
 import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
-from tempfile import TemporaryDirectory
 
-from bs4 import BeautifulSoup, Tag
-from playwright.async_api import async_playwright
+import httpx
+from bs4 import BeautifulSoup
+from playwright.async_api import BrowserContext, Page, async_playwright
 from pydantic import BaseModel
 
+from ..backend import backend
+from ..cpu_pool import cpu_pool
+from ..request_budget import spend_request
+from ..scheduler import Priority, current_priority
 from ..service import Service
 from ..services.steam import SteamDetails
-from ..utils import price_string_to_float
+from ..tracing import SPAN_KIND_CLIENT, tracer
+from ..utils import http_client, price_string_to_float
+
+NEGATIVE_RESULT_TTL = 60 * 60 * 24  # Apps SteamDB doesn't know are looked up again after this many seconds
+MAX_CONCURRENCY = 1  # Concurrent SteamDB lookups (they share a single browser profile)
+REQUEST_BUDGET = 4  # Upstream requests per lookup (the plain request and the browser, again after a captcha)
+
+BOT_PROTECTION_MARKERS = ("Just a moment...", "challenge-platform", "cf-chl")  # Cloudflare challenge pages
+
+DEFAULT_PROFILE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "steam_details", "steamdb_profile")
+CLEARANCE_COOKIE = "cf_clearance"  # Set by Cloudflare when the challenge was solved
+CAPTCHA_TIMEOUT = 60
+PROFILE_LOCK_POLL_INTERVAL = 0.5
+
+
+def find_historical_low(content: str) -> tuple[str, str] | None:
+    """Return the text and title of the euro cell of the lowest recorded price in the page (runs in the CPU pool)."""
+    soup = BeautifulSoup(content, "html.parser")
+    for table_tag in soup.find_all("table"):
+        thead = table_tag.find("thead")
+        tbody = table_tag.find("tbody")
+        if thead is None or tbody is None:
+            continue
+        thead_columns = [th.text.strip() for th in thead.find_all("th")]
+        if thead_columns != ["Currency", "Current Price", "Converted Price", "Lowest Recorded Price"]:
+            continue
+        for tr in tbody.find_all("tr"):
+            tds = tr.find_all("td")
+            if len(tds) == 5 and tds[0].text.strip() == "Euro":
+                td = tds[4]
+                if td.has_attr("class") and "muted" in td["class"]:
+                    return td.text, td["title"]
 
 
 class SteamDBDetails(BaseModel):
@@ -20,140 +60,212 @@ class SteamDBDetails(BaseModel):
 
 class SteamDB(Service):
     def __init__(self, name: str, log_name: str):
-        super().__init__(name, log_name, "https://steamdb.info/app/{steam.appid}/")
+        super().__init__(name, log_name, "https://steamdb.info/app/{steam.appid}/", negative_result_ttl=NEGATIVE_RESULT_TTL, max_concurrency=MAX_CONCURRENCY, request_budget=REQUEST_BUDGET)
 
-    async def _captcha(self, appid: int, timeout: int) -> None:  # noqa: ASYNC109
-        self.logger.warning("Displaying captcha or bot protection message")
-        play = await async_playwright().start()
-        with TemporaryDirectory() as td:
-            self.logger.debug(f"Temporary directory: {td}")
-
-            # New browser
-            browser = await play.firefox.launch_persistent_context(
-                user_data_dir=td,
-                headless=False
-            )
+        # Browser profile shared by the headless browser and the captcha, so a solved challenge is reused
+        self.profile_path = os.environ.get("STEAM_DETAILS_BROWSER_PROFILE", DEFAULT_PROFILE_PATH)
 
-            # New page
-            if len(browser.pages) > 0:
-                page = browser.pages[0]
-            else:
-                page = await browser.new_page()
+        # Cookies of the profile, sent with the plain HTTP requests while the clearance cookie is valid
+        self.cookies: dict[str, str] = {}
+        self.user_agent: str | None = None  # The clearance cookie is only accepted with the user agent it was issued to
+        self.clearance_expiry: float | None = None
 
+    def has_clearance(self) -> bool:
+        """Return True if the profile has a clearance cookie that is not expired."""
+        return self.clearance_expiry is not None and self.clearance_expiry > time.time()
+
+    @asynccontextmanager
+    async def _lock_profile(self) -> AsyncIterator[None]:
+        """Wait until no other worker uses the profile, a profile can only be opened by one browser at a time."""
+        os.makedirs(self.profile_path, exist_ok=True)
+        with open(os.path.join(self.profile_path, "steam_details.lock"), "w") as lock_file:  # noqa: ASYNC230
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(PROFILE_LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def _update_cookies(self, browser: BrowserContext, page: Page) -> None:
+        cookies = await browser.cookies("https://steamdb.info/")
+        now = time.time()
+        self.cookies = {cookie["name"]: cookie["value"] for cookie in cookies if cookie["expires"] == -1 or cookie["expires"] > now}
+        self.user_agent = await page.evaluate("navigator.userAgent")
+        clearance_expiry = next((cookie["expires"] for cookie in cookies if cookie["name"] == CLEARANCE_COOKIE), None)
+        if clearance_expiry is None or clearance_expiry == -1:  # Session cookies are gone after the browser is closed
+            self.clearance_expiry = None
+            self.logger.info("No clearance cookie")
+        else:
+            self.clearance_expiry = clearance_expiry
+            self.logger.info(f"Clearance cookie expires in {(clearance_expiry - now) / 60:.0f}min")
+
+    @asynccontextmanager
+    async def _open_page(self, headless: bool) -> AsyncIterator[Page]:
+        """Open a page in the browser with the persistent profile and remember its cookies when done."""
+        async with self._lock_profile():
+            self.logger.debug(f"Browser profile: {self.profile_path}")
+            play = await async_playwright().start()
+            try:
+                browser = await play.firefox.launch_persistent_context(
+                    user_data_dir=self.profile_path,
+                    headless=headless
+                )
+                try:
+                    # New page
+                    if len(browser.pages) > 0:
+                        page = browser.pages[0]
+                    else:
+                        page = await browser.new_page()
+
+                    yield page
+
+                    await self._update_cookies(browser, page)
+                finally:
+                    try:
+                        await browser.close()
+                    except Exception as e:  # noqa: BLE001
+                        self.logger.debug(f"Could not close the browser: {e.__class__.__name__}: {e}")
+            finally:
+                await play.stop()
+
+    async def _captcha(self, appid: int, timeout: int) -> None:  # noqa: ASYNC109
+        self.logger.warning("Displaying captcha or bot protection message")
+        async with self._open_page(headless=False) as page:
             # Open page
             response = await page.goto(f"https://steamdb.info/app/{appid}/")
             self.logger.info(f"Captcha response status: {response.status}")
 
             # Wait for captcha to be solved
             start_time = time.time()
-            while remaining_time := timeout - (time.time() - start_time) > 0:
-                # Wait for page reload
-                self.logger.info(f"Waiting for captcha to be solved (remaining time: {remaining_time:.0f}s)")
-                await page.wait_for_url(f"https://steamdb.info/app/{appid}/", timeout=remaining_time)
-
-        # Close
-        if browser._loop.is_running():
-            await browser.close()
-        if play._loop.is_running():
-            await play.stop()
-
-    async def _parse_page_content(self, content: str) -> Tag | None:
-        soup = BeautifulSoup(content, "html.parser")
-        for table_tag in soup.find_all("table"):
-            thead = table_tag.find("thead")
-            tbody = table_tag.find("tbody")
-            if thead is not None and tbody is not None:
-                thead_columns = []
-                for th in thead.find_all("th"):
-                    thead_columns.append(th.text.strip())
-                if thead_columns == ["Currency", "Current Price", "Converted Price", "Lowest Recorded Price"]:
-                    for tr in tbody.find_all("tr"):
-                        tds = tr.find_all("td")
-                        if len(tds) == 5:
-                            if tds[0].text.strip() == "Euro":
-                                td = tds[4]
-                                if td.has_attr("class") and "muted" in td["class"]:
-                                    self.logger.info(f"Found element: {td}")
-                                    return td
-                                else:
-                                    self.logger.debug("Muted class not found")
-                            else:
-                                self.logger.debug(f"Currency column didn't match: {tds[0].text.strip()}")
-                        else:
-                            self.logger.debug(f"tbody columns count didn't match: {tds}")
+            while (remaining_time := timeout - (time.time() - start_time)) > 0:
+                if page.is_closed():
+                    self.logger.warning("Captcha window was closed")
+                    return
+                try:
+                    content = await page.content()
+                except Exception as e:  # noqa: BLE001  # Navigating while the challenge reloads the page
+                    self.logger.debug(f"Could not get page content: {e.__class__.__name__}: {e}")
                 else:
-                    self.logger.debug(f"thead columns didn't match: {thead_columns}")
-            else:
-                self.logger.debug("thead or tbody not found")
+                    if not any(marker in content for marker in BOT_PROTECTION_MARKERS):
+                        self.logger.info("Captcha solved")
+                        return
+                self.logger.info(f"Waiting for captcha to be solved (remaining time: {remaining_time:.0f}s)")
+                await asyncio.sleep(1)
+            self.logger.warning("Captcha was not solved in time")
+
+    def _get_historical_low(self, steam: SteamDetails, cell: tuple[str, str]) -> SteamDBDetails:
+        text, title = cell
+        self.logger.info(f"Found historical low: {repr(text)} ({repr(title)})")
+        if "at" in text:
+            price_string, discount_string = text.split("at", 1)
+            discount = abs(int(discount_string.split("%", 1)[0]))
+        else:
+            price_string = text
+            discount = 0
+        historical_low_price = price_string_to_float(price_string)
+        if historical_low_price < steam.price:
+            historical_low = SteamDBDetails(
+                price=historical_low_price,
+                discount=discount,
+                iso_date=datetime.strptime(title.strip(), "%d %B %Y").date().isoformat(),
+                external_url=f"https://steamdb.info/app/{steam.appid}/"
+            )
+        else:
+            historical_low = SteamDBDetails(
+                price=steam.price,
+                discount=steam.discount,
+                iso_date=None,
+                external_url=f"https://steamdb.info/app/{steam.appid}/"
+            )
+        self.logger.info(f"Historical low: {historical_low}")
+        return historical_low
+
+    async def _record_tier(self, tier: str) -> None:
+        self.logger.info(f"Served by the {tier} tier")
+        await backend.increment_count(self.name, f"{tier}_tier_count")
+
+    async def _get_game_details_with_http(self, steam: SteamDetails) -> tuple[bool, SteamDBDetails | None]:
+        """
+        Try to get the historical low with a plain HTTP request.
+
+        Return False if the browser is needed (bot protection or the price table is missing).
+        """
+        headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.5"
+        }
+        if self.has_clearance():  # Reuse the solved challenge of the browser
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+            headers["User-Agent"] = self.user_agent
+        elif self.clearance_expiry is not None:
+            self.logger.info("Clearance cookie expired")
+            self.clearance_expiry = None
+        r = await http_client.get(f"https://steamdb.info/app/{steam.appid}/", headers=headers)
+        self.logger.info(f"Response status: {r.status_code}")
+        if r.status_code == 404:
+            return True, None
+        if r.status_code != 200 or any(marker in r.text for marker in BOT_PROTECTION_MARKERS):
+            self.logger.info("Bot protection, using the browser")
+            return False, None
+        self.logger.info(f"Page content (100 chars): {repr(r.text[:100])}")
+        self.logger.debug(f"Page content (all): {r.text}")
+
+        cell = await cpu_pool.run(find_historical_low, r.text)
+        if cell is None:
+            self.logger.info("Price table not found, using the browser")
+            return False, None
+        return True, self._get_historical_low(steam, cell)
 
     async def get_game_details(self, steam: SteamDetails, allow_captcha: bool = True) -> SteamDBDetails | None:
-        """Get steam historical low price from SteamDB."""
+        """Get steam historical low price from SteamDB (with a plain HTTP request first and the browser only if needed)."""
         self.logger.info(f"Getting historical low for {steam.appid}")
 
         if steam.price is None or steam.discount is None:
             raise Exception("Steam price or discount not found")
 
-        play = await async_playwright().start()
-        with TemporaryDirectory() as td:
-            self.logger.debug(f"Temporary directory: {td}")
-
-            # New browser
-            browser = await play.firefox.launch_persistent_context(
-                user_data_dir=td,
-                headless=True
-            )
-
-            # New page
-            if len(browser.pages) > 0:
-                page = browser.pages[0]
+        # Plain HTTP
+        if allow_captcha:  # Not again when retrying after a captcha
+            try:
+                served, historical_low = await self._get_game_details_with_http(steam)
+            except httpx.HTTPError as e:
+                self.logger.info(f"Plain HTTP request failed, using the browser: {e.__class__.__name__}: {e}")
             else:
-                page = await browser.new_page()
+                if served:
+                    await self._record_tier("http")
+                    return historical_low
 
+        # Browser
+        await self._record_tier("browser")
+        async with self._open_page(headless=True) as page:
             # Open page
-            response = await page.goto(f"https://steamdb.info/app/{steam.appid}/")
+            spend_request()
+            with tracer.span("browser GET steamdb.info", SPAN_KIND_CLIENT, **{"server.address": "steamdb.info"}) as span:
+                response = await page.goto(f"https://steamdb.info/app/{steam.appid}/")
+                span.attributes["http.response.status_code"] = response.status
             self.logger.info(f"Response status: {response.status}")
             if response.status == 404:
                 return
-            elif response.status == 403 and allow_captcha:  # Try to bypass bot protection
-                await self._captcha(steam.appid, timeout=20)
-                return self.get_game_details(steam, allow_captcha=False)
-            if response.status != 200:
-                raise Exception(f"Unexpected status: {response.status}")
-
-            # Get response
-            page_content = await page.content()
-            self.logger.info(f"Page content (100 chars): {repr(page_content[:100])}")
-            self.logger.debug(f"Page content (all): {page_content}")
-
-            # Parse response
-            element = await self._parse_page_content(page_content)
-            if element is None:
-                raise Exception("Element not found")
-            if "at" in element.text:
-                price_string, discount_string = element.text.split("at", 1)
-                discount = abs(int(discount_string.split("%", 1)[0]))
-            else:
-                price_string = element.text
-                discount = 0
-            historical_low_price = price_string_to_float(price_string)
-            if historical_low_price < steam.price:
-                historical_low = SteamDBDetails(
-                    price=historical_low_price,
-                    discount=discount,
-                    iso_date=datetime.strptime(element["title"].strip(), "%d %B %Y").date().isoformat(),
-                    external_url=f"https://steamdb.info/app/{steam.appid}/"
-                )
-            else:
-                historical_low = SteamDBDetails(
-                    price=steam.price,
-                    discount=steam.discount,
-                    iso_date=None,
-                    external_url=f"https://steamdb.info/app/{steam.appid}/"
-                )
-            self.logger.info(f"Historical low: {historical_low}")
+            if response.status != 403:
+                if response.status != 200:
+                    raise Exception(f"Unexpected status: {response.status}")
+
+                # Get response
+                page_content = await page.content()
+                self.logger.info(f"Page content (100 chars): {repr(page_content[:100])}")
+                self.logger.debug(f"Page content (all): {page_content}")
 
-            # Close
-            await browser.close()
-            await play.stop()
+                # Parse response
+                cell = await cpu_pool.run(find_historical_low, page_content)
+                if cell is None:
+                    raise Exception("Element not found")
+                return self._get_historical_low(steam, cell)
 
-            return historical_low
+        # Try to bypass bot protection (after the headless browser released the profile), only if a user waits to solve it
+        if not allow_captcha or current_priority.get() != Priority.INTERACTIVE:
+            raise Exception("Blocked by bot protection")
+        await self._captcha(steam.appid, timeout=CAPTCHA_TIMEOUT)
+        return await self.get_game_details(steam, allow_captcha=False)
@@ -0,0 +1,262 @@
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+import httpx
+import orjson
+
+MAX_TRACES = 200  # Recent traces kept for /api/trace
+MAX_SPANS_PER_TRACE = 1000
+
+# Span kinds and status codes of OpenTelemetry
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_UNSET = 0
+STATUS_CODE_ERROR = 2
+
+
+class Span:
+    """A timed operation of a trace (like a request, a service task or an upstream request)."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_time", "end_time", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, kind: int, attributes: dict[str, Any]) -> None:
+        self.trace_id = trace_id  # 32 hex digits
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_time = time.time_ns()
+        self.end_time: int | None = None
+        self.attributes = attributes
+        self.error: str | None = None
+
+    def end(self) -> None:
+        """End the span and export it (only the first call counts)."""
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            tracer.export(self)
+
+    def to_otlp(self) -> dict:
+        """Return the span in the OTLP JSON format."""
+        attributes = []
+        for key, value in self.attributes.items():
+            if isinstance(value, bool):
+                attributes.append({"key": key, "value": {"boolValue": value}})
+            elif isinstance(value, int):
+                attributes.append({"key": key, "value": {"intValue": str(value)}})
+            elif isinstance(value, float):
+                attributes.append({"key": key, "value": {"doubleValue": value}})
+            else:
+                attributes.append({"key": key, "value": {"stringValue": str(value)}})
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time or self.start_time),
+            "attributes": attributes,
+            "status": {"code": STATUS_CODE_UNSET} if self.error is None else {"code": STATUS_CODE_ERROR, "message": self.error}
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """Return the trace id and parent span id of a W3C traceparent header."""
+    if value is None:
+        return
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return
+    return parts[1], parts[2]
+
+
+class Tracer:
+    """
+    Keep the spans of recent traces in memory and optionally export every finished span to a file.
+
+    The file has one OTLP JSON export request per line (like the file exporter of the OpenTelemetry collector), it's written by a thread.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path  # None disables the file export
+        self._traces: OrderedDict[str, list[Span]] = OrderedDict()  # Trace id -> spans, oldest trace first
+        self._queue: queue.SimpleQueue[Span] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def configure(self, path: str | None) -> None:
+        """Change the file of the exporter (before the first span ends)."""
+        self.path = path
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, Any] | None = None,
+        parent: tuple[str, str] | None = None
+    ) -> Span:
+        """Start a span as a child of the current span (or of the given trace id and span id of a remote parent)."""
+        if parent is None:
+            current = current_span.get()
+            parent = None if current is None else (current.trace_id, current.span_id)
+        trace_id, parent_id = (secrets.token_hex(16), None) if parent is None else parent
+        span = Span(name, trace_id, parent_id, kind, attributes or {})
+
+        spans = self._traces.get(trace_id)
+        if spans is None:
+            spans = self._traces[trace_id] = []
+            if len(self._traces) > MAX_TRACES:
+                self._traces.popitem(last=False)
+        if len(spans) < MAX_SPANS_PER_TRACE:
+            spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        """Run the block in a new span that is the current span of the block."""
+        span = self.start_span(name, kind, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def get_trace(self, trace_id: str) -> list[Span] | None:
+        """Return the spans of a recent trace."""
+        return self._traces.get(trace_id)
+
+    def export(self, span: Span) -> None:
+        """Queue the finished span for the file exporter."""
+        if self.path is None:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_spans, name="trace-exporter", daemon=True)
+            self._thread.start()
+        self._queue.put(span)
+
+    def _write_spans(self) -> None:
+        # Imported here because the http client in utils is created with the tracing transport
+        from .utils import ANSICodes
+
+        logger = logging.getLogger(f"{ANSICodes.MAGENTA}tracing{ANSICodes.RESET}")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        while True:
+            spans = [self._queue.get()]
+            while not self._queue.empty():
+                spans.append(self._queue.get())
+            line = orjson.dumps({
+                "resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "steam_details"}}]},
+                    "scopeSpans": [{"scope": {"name": "steam_details"}, "spans": [span.to_otlp() for span in spans]}]
+                }]
+            })
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(line + b"\n")
+            except OSError as e:
+                logger.error(f"Could not export {len(spans)} spans: {e.__class__.__name__}: {e}")
+
+
+def get_waterfall(spans: list[Span]) -> dict:
+    """Return the spans of a trace in start order with their offset from the start of the trace and their depth."""
+    spans = sorted(spans, key=lambda span: span.start_time)
+    trace_start = spans[0].start_time
+    trace_end = max(span.end_time or span.start_time for span in spans)
+    depths: dict[str, int] = {}
+    waterfall = []
+    for span in spans:
+        depth = depths[span.span_id] = depths.get(span.parent_id, -1) + 1 if span.parent_id is not None else 0
+        waterfall.append({
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "depth": depth,
+            "start_ms": round((span.start_time - trace_start) / 1e6, 3),
+            "duration_ms": None if span.end_time is None else round((span.end_time - span.start_time) / 1e6, 3),
+            "attributes": span.attributes,
+            "error": span.error
+        })
+    return {
+        "trace_id": spans[0].trace_id,
+        "duration_ms": round((trace_end - trace_start) / 1e6, 3),
+        "spans": waterfall
+    }
+
+
+class _TracedStream(httpx.AsyncByteStream):
+    """Count the bytes of the response body and end the span when the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, span: Span) -> None:
+        self._stream = stream
+        self._span = span
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:  # noqa: D105
+        async for chunk in self._stream:
+            self._span.attributes["http.response.body.size"] += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:  # noqa: D102
+        try:
+            await self._stream.aclose()
+        finally:
+            self._span.end()
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Add a client span for every request with its host, status and body size (as received, before decoding)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:  # noqa: D102
+        span = tracer.start_span(f"{request.method} {request.url.host}", SPAN_KIND_CLIENT, {
+            "http.request.method": request.method,
+            "server.address": request.url.host,
+            "url.full": str(request.url.copy_with(query=None)),
+        })
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException as e:
+            span.error = f"{e.__class__.__name__}: {e}"
+            span.end()
+            raise
+        span.attributes["http.response.status_code"] = response.status_code
+        if response.status_code >= 500:
+            span.error = f"HTTP {response.status_code}"
+        if response.is_closed:  # Already read, like responses created by other transports
+            span.attributes["http.response.body.size"] = len(response.content)
+            span.end()
+        else:
+            span.attributes["http.response.body.size"] = 0
+            response.stream = _TracedStream(response.stream, span)
+        return response
+
+    async def aclose(self) -> None:  # noqa: D102
+        await self.transport.aclose()
+
+
+tracer = Tracer(os.environ.get("STEAM_DETAILS_TRACE_FILE") or None)
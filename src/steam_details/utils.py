@@ -1,7 +1,79 @@
+import asyncio
+import hashlib
+import logging
+import os
+
 import httpx
+from typing_extensions import TypedDict
+
+from .http_cache import DEFAULT_MAX_SIZE, DEFAULT_PATH, CacheTransport, HTTPCache
+from .request_budget import BudgetTransport
+from .tracing import TracingTransport
+
+
+class UpstreamConfig(TypedDict):
+    http2: bool  # Negotiated via ALPN, falls back to HTTP/1.1 if the upstream doesn't support it
+    limits: httpx.Limits
+    prewarm: int  # Number of connections opened at startup
+
+
+UPSTREAMS: dict[str, UpstreamConfig] = {
+    "api.steampowered.com": {  # Only used for the app list
+        "http2": False,
+        "limits": httpx.Limits(max_connections=2, max_keepalive_connections=1, keepalive_expiry=30),
+        "prewarm": 1
+    },
+    "store.steampowered.com": {
+        "http2": True,
+        "limits": httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60),
+        "prewarm": 1
+    },
+    "steamdb.info": {  # Only the plain HTTP tier, the browser has its own connections
+        "http2": True,
+        "limits": httpx.Limits(max_connections=2, max_keepalive_connections=2, keepalive_expiry=60),
+        "prewarm": 0
+    },
+    "www.protondb.com": {
+        "http2": True,
+        "limits": httpx.Limits(max_connections=8, max_keepalive_connections=8, keepalive_expiry=60),
+        "prewarm": 1
+    },
+    "howlongtobeat.com": {
+        "http2": True,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=60),
+        "prewarm": 1
+    },
+    "www.keyforsteam.de": {
+        "http2": True,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=60),
+        "prewarm": 1
+    },
+    "www.allkeyshop.com": {
+        "http2": True,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=60),
+        "prewarm": 1
+    }
+}
+
+
+def create_http_client(
+    upstreams: dict[str, UpstreamConfig],
+    scheme: str = "https",
+    cache: HTTPCache | None = None
+) -> httpx.AsyncClient:
+    """
+    Create a client with a separate connection pool for every upstream host (and an optional HTTP cache in front of them).
 
-http_client = httpx.AsyncClient(timeout=15)
-http_client.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64; rv:129.0) Gecko/20100101 Firefox/129.0"
+    Requests that reach the network are traced and count against the request budget of the current service call,
+    responses from the HTTP cache don't.
+    """
+    mounts: dict[str, httpx.AsyncBaseTransport] = {}
+    for host, config in upstreams.items():
+        transport = BudgetTransport(TracingTransport(httpx.AsyncHTTPTransport(http2=config["http2"], limits=config["limits"])))
+        mounts[f"{scheme}://{host}"] = transport if cache is None else CacheTransport(transport, cache)
+    client = httpx.AsyncClient(timeout=15, mounts=mounts, transport=BudgetTransport(TracingTransport(httpx.AsyncHTTPTransport())))
+    client.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64; rv:129.0) Gecko/20100101 Firefox/129.0"
+    return client
 
 
 _ROMAN_DIGITS = [
@@ -30,6 +102,44 @@ class ANSICodes:
     CYAN = "\033[36m"
 
 
+_logger = logging.getLogger(f"{ANSICodes.MAGENTA}http_client{ANSICodes.RESET}")
+
+# An empty path disables the cache
+http_cache = HTTPCache(
+    os.environ.get("STEAM_DETAILS_HTTP_CACHE", DEFAULT_PATH) or None,
+    int(os.environ.get("STEAM_DETAILS_HTTP_CACHE_SIZE", DEFAULT_MAX_SIZE))
+)
+http_client = create_http_client(UPSTREAMS, cache=http_cache)
+
+
+async def _open_connection(client: httpx.AsyncClient, url: str) -> None:
+    try:
+        r = await client.head(url)
+    except httpx.HTTPError as e:
+        _logger.warning(f"Could not prewarm connection to {repr(url)}: {e.__class__.__name__}: {e}")
+    else:
+        _logger.debug(f"Prewarmed connection to {repr(url)} ({r.http_version})")
+
+
+async def prewarm_connections(
+    client: httpx.AsyncClient = http_client,
+    upstreams: dict[str, UpstreamConfig] = UPSTREAMS,
+    scheme: str = "https"
+) -> None:
+    """Open connections to the known upstream hosts, so the first lookups don't pay for the handshakes."""
+    _logger.info(f"Prewarming connections to {len(upstreams)} upstream hosts")
+    await asyncio.gather(*(
+        _open_connection(client, f"{scheme}://{host}/")
+        for host, config in upstreams.items()
+        for _ in range(config["prewarm"])
+    ))
+
+
+def make_digest(body: bytes) -> str:
+    """Return the digest used for the strong ETag of the body."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
 def price_string_to_float(price_string: str) -> float:
     """Convert a price string to a float."""
     return float(price_string.replace("€", "").replace(" ", "").replace(",", ".").replace("-", "0"))
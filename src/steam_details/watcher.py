@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import time
+import traceback
+
+import orjson
+from typing_extensions import TypedDict
+
+from .backend import backend
+from .scheduler import Priority, current_priority
+from .service_manager import service_manager
+from .services.steam import SteamDetails
+from .utils import ANSICodes, http_client
+
+
+class WatchedGame(TypedDict):
+    steam: dict  # SteamDetails with the latest price and discount
+    key_price: float | None
+    key_historical_low: float | None
+    steam_historical_low: float | None
+    deals: list[str]  # Currently active deal reasons
+
+
+class Alert(TypedDict):
+    profile: str
+    appid: int
+    name: str
+    reasons: list[str]
+    steam_price: float | None
+    discount: int | None
+    steam_historical_low: float | None
+    key_price: float | None
+    key_historical_low: float | None
+    external_url: str
+
+
+class PriceWatcher:
+    """
+    Watch wishlists for deals.
+
+    Only the price-bearing services (Steam prices and KeyForSteam) are refreshed,
+    deals are only evaluated again for games whose prices changed.
+    """
+
+    def __init__(
+        self,
+        wishlists: list[str],
+        interval: float,
+        webhook_url: str | None = None,
+        min_discount: int | None = None,
+        max_price: float | None = None
+    ) -> None:
+        self.logger = logging.getLogger(f"{ANSICodes.MAGENTA}watcher{ANSICodes.RESET}")
+
+        self.wishlists = wishlists
+        self.interval = interval
+        self.webhook_url = webhook_url
+        self.min_discount = min_discount
+        self.max_price = max_price
+
+        self.games: dict[int, WatchedGame] = {}  # appid -> state of the last check
+
+    async def _load_state(self) -> None:
+        blob = await backend.get_blob("watcher_state")
+        if blob is not None:
+            self.games = {int(appid): game for appid, game in orjson.loads(blob[1]).items()}
+            self.logger.info(f"Loaded watcher state with {len(self.games)} games")
+
+    async def _save_state(self) -> None:
+        await backend.set_blob("watcher_state", orjson.dumps({str(appid): game for appid, game in self.games.items()}))
+
+    def _get_deals(self, game: WatchedGame) -> list[str]:
+        """Evaluate the deal reasons for a game."""
+        steam = game["steam"]
+        deals: list[str] = []
+        if steam["price"] is not None and steam["price"] > 0:
+            if game["steam_historical_low"] is not None and steam["price"] <= game["steam_historical_low"]:
+                deals.append("steam_historical_low")
+            if self.min_discount is not None and steam["discount"] >= self.min_discount:
+                deals.append("discount")
+        if game["key_price"] is not None and game["key_historical_low"] is not None and game["key_price"] <= game["key_historical_low"]:
+            deals.append("key_historical_low")
+        if self.max_price is not None:
+            prices = [price for price in (steam["price"], game["key_price"]) if price is not None and price > 0]
+            if prices and min(prices) <= self.max_price:
+                deals.append("max_price")
+        return deals
+
+    async def _alert(self, alert: Alert) -> None:
+        self.logger.warning(f"Deal for {repr(alert['name'])} ({alert['appid']}): {', '.join(alert['reasons'])}")
+        if self.webhook_url is not None:
+            try:
+                r = await http_client.post(self.webhook_url, json=alert)
+                r.raise_for_status()
+            except Exception as e:  # noqa: BLE001
+                self.logger.error(f"Could not send alert to webhook: {e.__class__.__name__}: {e}")
+
+    async def _get_key_prices(self, steam: SteamDetails) -> tuple[float | None, float | None]:
+        """Return the cheapest key price and its historical low."""
+        if steam.price is None or steam.price <= 0:
+            return None, None
+        keyforsteam = await service_manager.keyforsteam.create_task(steam=steam)
+        if keyforsteam is None:
+            return None, None
+        return keyforsteam.cheapest_offer["price"], keyforsteam.historical_low["price"]
+
+    async def _add_game(self, appid: int) -> WatchedGame | None:
+        """Look up a new game with all price-bearing services (and SteamDB once)."""
+        steam = await service_manager.steam.create_task(appid=appid)
+        if steam is None:
+            return
+
+        steam_historical_low = None
+        if steam.price is not None and steam.price > 0:
+            try:
+                steamdb = await service_manager.steamdb.create_task(steam=steam)
+                if steamdb is not None:
+                    steam_historical_low = steamdb.price
+            except Exception:  # noqa: BLE001
+                traceback.print_exc()
+
+        key_price, key_historical_low = await self._get_key_prices(steam)
+
+        return WatchedGame(
+            steam=steam.model_dump(),
+            key_price=key_price,
+            key_historical_low=key_historical_low,
+            steam_historical_low=steam_historical_low,
+            deals=[]
+        )
+
+    async def _refresh_game(self, game: WatchedGame, price: tuple[float, int] | None) -> bool:
+        """Refresh the prices of a known game and return True if any of them changed."""
+        steam_data = dict(game["steam"])
+        if price is not None:
+            steam_data["price"], steam_data["discount"] = price
+        elif steam_data["price"] is not None and steam_data["price"] > 0:  # Not available anymore
+            steam_data["price"], steam_data["discount"] = None, None
+
+        key_price, key_historical_low = await self._get_key_prices(SteamDetails(**steam_data))
+
+        changed = (
+            steam_data["price"] != game["steam"]["price"]
+            or steam_data["discount"] != game["steam"]["discount"]
+            or key_price != game["key_price"]
+        )
+        game["steam"] = steam_data
+        game["key_price"] = key_price
+        game["key_historical_low"] = key_historical_low
+        if steam_data["price"] is not None and game["steam_historical_low"] is not None:
+            game["steam_historical_low"] = min(game["steam_historical_low"], steam_data["price"])
+        return changed
+
+    async def check_wishlist(self, profile_name_or_id: str) -> list[Alert]:
+        """Check a wishlist once and send alerts for new deals."""
+        self.logger.info(f"Checking wishlist {repr(profile_name_or_id)}")
+        appids = await service_manager.get_wishlist(profile_name_or_id)
+        if appids is None:
+            self.logger.error(f"Wishlist {repr(profile_name_or_id)} not found (it must be public)")
+            return []
+
+        known_appids = [appid for appid in appids if appid in self.games]
+        prices = await service_manager.steam.get_prices(known_appids) if known_appids else {}
+
+        alerts: list[Alert] = []
+        for appid in appids:
+            try:
+                if appid in self.games:
+                    game = self.games[appid]
+                    if not await self._refresh_game(game, prices.get(appid)):
+                        self.logger.debug(f"Prices of {appid} didn't change")
+                        continue
+                else:
+                    game = await self._add_game(appid)
+                    if game is None:
+                        continue
+                    self.games[appid] = game
+            except Exception as e:  # noqa: BLE001
+                self.logger.error(f"Could not check {appid}: {e.__class__.__name__}: {e}")
+                continue
+
+            # Evaluate deals again, only new ones are alerted
+            deals = self._get_deals(game)
+            new_deals = [deal for deal in deals if deal not in game["deals"]]
+            game["deals"] = deals
+            if new_deals:
+                alert = Alert(
+                    profile=profile_name_or_id,
+                    appid=appid,
+                    name=game["steam"]["name"],
+                    reasons=new_deals,
+                    steam_price=game["steam"]["price"],
+                    discount=game["steam"]["discount"],
+                    steam_historical_low=game["steam_historical_low"],
+                    key_price=game["key_price"],
+                    key_historical_low=game["key_historical_low"],
+                    external_url=game["steam"]["external_url"]
+                )
+                alerts.append(alert)
+                await self._alert(alert)
+
+        await self._save_state()
+        return alerts
+
+    async def run(self, once: bool = False) -> None:
+        """Check all wishlists every interval (or only once)."""
+        current_priority.set(Priority.BACKGROUND)  # Nobody waits for the checks
+        await service_manager.load_services()
+        await self._load_state()
+        while True:
+            start_time = time.time()
+            for profile_name_or_id in self.wishlists:
+                try:
+                    await self.check_wishlist(profile_name_or_id)
+                except Exception as e:  # noqa: BLE001
+                    self.logger.error(f"Could not check wishlist {repr(profile_name_or_id)}: {e.__class__.__name__}: {e}")
+                    traceback.print_exc()
+            self.logger.info(f"Checked {len(self.wishlists)} wishlists in {time.time() - start_time:.2f}s")
+            if once:
+                return
+            await asyncio.sleep(self.interval)
@@ -1,33 +1,42 @@
 import asyncio
 import logging
+import os
 import time
 import traceback
-from typing import Any, Literal
-
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel
-from typing_extensions import TypedDict
-
-from ..service import Service
+from collections.abc import Coroutine
+from typing import Any
+
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response, status
+
+from ..backend import backend
+from ..details import (
+    DETAILS_MAX_AGE,
+    collect_details,
+    complete_in_background,
+    lookup_details,
+    render_details,
+    store_details,
+)
+from ..price_history import SOURCES, price_history
+from ..profiling import MAX_DURATION, SamplingProfiler
+from ..scheduler import Priority, current_priority
 from ..service_manager import service_manager
 from ..services.steam import SteamDetails
+from ..tracing import (
+    SPAN_KIND_SERVER,
+    current_span,
+    get_waterfall,
+    parse_traceparent,
+    tracer,
+)
 from ..utils import ANSICodes
-
-
-class ServiceDetails(TypedDict):
-    success: Literal[True]
-    data: Any
-
-
-class ServiceError(TypedDict):
-    success: Literal[False]
-    error: str
-    url: str
-
-
-class Details(BaseModel):
-    services: dict[str, ServiceDetails | ServiceError]
-    from_cache: bool
+from ..wishlist_summary import COLUMNS, LINUX_TIERS, SummaryFilters, wishlist_summary
+from .responses import (
+    REVALIDATE_CACHE_CONTROL,
+    encoded_response,
+    json_response,
+)
 
 
 def raise_steam_error(error: Exception) -> None:
@@ -39,56 +48,347 @@ def raise_steam_error(error: Exception) -> None:
     )
 
 
-async def get_json_from_task(task: asyncio.Task[BaseModel | None], service: Service) -> ServiceDetails | ServiceError:
-    """Run the task and return the result as a JSON object with success status."""
+def start_background_task(coroutine: Coroutine[Any, Any, None]) -> None:
+    """Run the coroutine in the background and keep a reference until it is done."""
+    background_task = asyncio.create_task(coroutine)
+    background_tasks.add(background_task)
+    background_task.add_done_callback(background_tasks.discard)
+
+
+async def refresh_in_background(appid: int) -> None:
+    """Look up the game again and replace its stale details."""
+    current_priority.set(Priority.BACKGROUND)  # Only for this task, nobody waits for it
+    try:
+        logger.info(f"Refreshing stale details for app {appid}")
+        await lookup_details(appid)
+        logger.debug(f"Refreshed details for app {appid}")
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Could not refresh details for app {appid}: {e.__class__.__name__}: {e}")
+        traceback.print_exc()
+    finally:
+        refreshing_appids.discard(appid)
+
+
+class WishlistPrefetch:
+    """Details lookups for the first games of a wishlist, started before the client asks for them."""
+
+    __slots__ = ("appids", "last_activity", "task")
+
+    def __init__(self, appids: list[int]) -> None:
+        self.appids = set(appids)
+        self.last_activity = time.time()  # Of the client, updated by its details requests
+        self.task: asyncio.Task[None] | None = None
+
+
+async def prefetch_details(appid: int) -> None:
+    """
+    Look up the details of a wishlist game.
+
+    Like the details route, services that take longer than the budget are stored as pending and completed in the background.
+    """
     try:
-        response = await task
-        if response is None:
-            return {
-                "success": True,
-                "data": None
-            }
-        else:
-            return {
-                "success": True,
-                "data": response.model_dump()
-            }
+        logger.info(f"Prefetching details for app {appid}")
+        steam = await service_manager.steam.create_task(appid=appid)
+        if steam is None:
+            return
+        cached_details, pending_tasks = await collect_details(steam, PREFETCH_BUDGET)
+        await store_details(appid, cached_details)
+        if pending_tasks:
+            start_background_task(complete_in_background(appid, cached_details, pending_tasks))
     except Exception as e:  # noqa: BLE001
-        if service.error_url is None:
-            raise Exception("Service error URL not set")  # noqa: B904
-        else:
-            traceback.print_exc()
-        return {
-            "success": False,
-            "error": f"{e.__class__.__name__}: {e}",
-            "url": service.error_url
-        }
+        logger.error(f"Could not prefetch details for app {appid}: {e.__class__.__name__}: {e}")
+    finally:
+        prefetching_tasks.pop(appid, None)
+
+
+async def prefetch_wishlist(prefetch: WishlistPrefetch, appids: list[int]) -> None:
+    """
+    Look up the games in wishlist order, one every PREFETCH_INTERVAL seconds and at most PREFETCH_MAX_RUNNING at a time.
+
+    Stop (and cancel the running lookups) if the client didn't ask for details for PREFETCH_IDLE_TIMEOUT seconds.
+    """
+    current_priority.set(Priority.BATCH)
+    running: set[asyncio.Task[None]] = set()
+    try:
+        for appid in appids:
+            if appid in prefetching_tasks or appid in refreshing_appids or await backend.get_details(appid) is not None:
+                continue
+            while len(running) >= PREFETCH_MAX_RUNNING:
+                await asyncio.wait(running, timeout=PREFETCH_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                running = {task for task in running if not task.done()}
+                if time.time() - prefetch.last_activity > PREFETCH_IDLE_TIMEOUT:
+                    break
+            if time.time() - prefetch.last_activity > PREFETCH_IDLE_TIMEOUT:
+                logger.info("Client went away, stopping the prefetch")
+                return
+
+            task = asyncio.create_task(prefetch_details(appid))
+            prefetching_tasks[appid] = task
+            running.add(task)
+            await asyncio.sleep(PREFETCH_INTERVAL)
+
+        # Keep the lookups cancellable until they are done
+        while running:
+            await asyncio.wait(running, timeout=PREFETCH_INTERVAL)
+            running = {task for task in running if not task.done()}
+            if time.time() - prefetch.last_activity > PREFETCH_IDLE_TIMEOUT:
+                logger.info("Client went away, stopping the prefetch")
+                return
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def start_prefetch(profile_name_or_id: str, appids: list[int]) -> None:
+    """Prefetch the details of the first games of the wishlist (a previous prefetch of the same wishlist is replaced)."""
+    key = profile_name_or_id.lower()
+    previous_prefetch = wishlist_prefetches.pop(key, None)
+    if previous_prefetch is not None and previous_prefetch.task is not None:
+        previous_prefetch.task.cancel()
+    if not appids:
+        return
+
+    prefetch = WishlistPrefetch(appids)
+    prefetch.task = asyncio.create_task(prefetch_wishlist(prefetch, appids))
+    prefetch.task.add_done_callback(lambda _: wishlist_prefetches.pop(key, None) if wishlist_prefetches.get(key) is prefetch else None)
+    wishlist_prefetches[key] = prefetch
+
+
+def record_client_activity(appid: int) -> None:
+    """Keep the prefetches of wishlists with the game running."""
+    for prefetch in wishlist_prefetches.values():
+        if appid in prefetch.appids:
+            prefetch.last_activity = time.time()
+
+
+async def wait_for_prefetch(appid: int, timeout: float | None) -> None:  # noqa: ASYNC109
+    """
+    Wait if the details of the game are being prefetched.
+
+    Waits at most for the timeout and the prefetch budget, the prefetch continues if it takes longer or the request is cancelled.
+    """
+    task = prefetching_tasks.get(appid)
+    if task is not None:
+        logger.debug(f"Waiting for the prefetch of app {appid}")
+        await asyncio.wait([task], timeout=PREFETCH_BUDGET if timeout is None else min(timeout, PREFETCH_BUDGET))
+
+
+async def get_cached_response(request: Request, appid: int, use_cache: bool) -> Response | None:
+    """
+    Return the cached details for the app or None if they have to be looked up.
+
+    Stale details are returned as well while a background task refreshes them.
+    """
+    logger.debug(f"Checking cache for app {appid}")
+    record = await backend.get_details(appid)
+    if record is None:
+        return
+    if not use_cache:
+        logger.debug(f"Removing cache for app {appid}")
+        await backend.delete_details(appid)
+        return
+
+    age = time.time() - record.cache_time
+    if age > DETAILS_MAX_AGE and appid not in refreshing_appids:
+        refreshing_appids.add(appid)
+        start_background_task(refresh_in_background(appid))
+
+    logger.debug(f"Using cache for app {appid} ({age:.0f}s old)")
+    return encoded_response(
+        request,
+        record.body,
+        "application/json",
+        REVALIDATE_CACHE_CONTROL,
+        digest=record.digest
+    )
 
 
 app = FastAPI(openapi_url=None)
 
 details_lock = asyncio.Lock()
 
-details_cache: dict[float, dict[str, ServiceDetails | ServiceError]] = {}
+background_tasks: set[asyncio.Task[None]] = set()  # Strong references to running background tasks
+refreshing_appids: set[int] = set()
+
+PREFETCH_COUNT = 20  # First games of a wishlist that are prefetched by default
+PREFETCH_INTERVAL = 0.5  # Seconds between starting two prefetch lookups
+PREFETCH_BUDGET = 5  # Seconds until slow services of a prefetch lookup continue in the background (like the budget of the client)
+PREFETCH_MAX_RUNNING = 4  # Prefetch lookups of a wishlist running at the same time
+PREFETCH_IDLE_TIMEOUT = 30  # Seconds without details requests for the wishlist until the client is considered gone
+
+wishlist_prefetches: dict[str, WishlistPrefetch] = {}  # Lowercase profile name or id -> running prefetch
+prefetching_tasks: dict[int, asyncio.Task[None]] = {}  # App id -> running prefetch lookup
+
+PROFILING_ENABLED = os.environ.get("STEAM_DETAILS_PROFILING") == "1"  # Allows the profile query parameter and /profile
+profiling_lock = asyncio.Lock()  # One profile at a time, the samples of two profiles would include each other
 
 logger = logging.getLogger(f"{ANSICodes.MAGENTA}api{ANSICodes.RESET}")
 
 
+def profile_response(profiler: SamplingProfiler, headers: dict[str, str] | None = None) -> Response:
+    """Return the samples of the profiler as folded stacks."""
+    return Response(profiler.folded(), media_type="text/plain", headers={
+        "Cache-Control": "no-store",
+        "X-Profile-Samples": str(profiler.sample_count),
+        "X-Profile-Duration": f"{profiler.duration:.3f}",
+        **(headers or {})
+    })
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Return a profile of the request instead of its response if the profile query parameter is set.
+
+    The status of the response is in the X-Profile-Status header.
+    """
+    if "profile" not in request.query_params:
+        return await call_next(request)
+    if not PROFILING_ENABLED:
+        return Response(orjson.dumps({"detail": "Profiling is disabled"}), status.HTTP_403_FORBIDDEN, media_type="application/json")
+    if profiling_lock.locked():
+        return Response(orjson.dumps({"detail": "Already profiling"}), status.HTTP_409_CONFLICT, media_type="application/json")
+
+    async with profiling_lock:
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = await call_next(request)
+            async for _ in response.body_iterator:  # Sending the body is part of the request
+                pass
+        finally:
+            await asyncio.to_thread(profiler.stop)  # Joins the sampler thread
+    logger.info(f"Profiled {request.url.path} ({profiler.sample_count} samples in {profiler.duration:.2f}s)")
+    return profile_response(profiler, {"X-Profile-Status": str(response.status_code)})
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Run the request in a root span (or continue the trace of a traceparent header) and return its trace id."""
+    span = tracer.start_span(f"{request.method} {request.url.path}", SPAN_KIND_SERVER, {
+        "http.request.method": request.method,
+        "url.path": request.url.path,
+        "url.query": request.url.query
+    }, parent=parse_traceparent(request.headers.get("traceparent")))
+    token = current_span.set(span)
+    try:
+        response = await call_next(request)
+    except BaseException as e:
+        span.error = f"{e.__class__.__name__}: {e}"
+        raise
+    else:
+        span.attributes["http.response.status_code"] = response.status_code
+        response.headers["X-Trace-Id"] = span.trace_id
+        return response
+    finally:
+        current_span.reset(token)
+        span.end()
+
+
 @app.get("/wishlist")
-async def wishlist(profile_name_or_id: str):
-    """Get the wishlist data for the given profile name or id."""
+async def wishlist(request: Request, profile_name_or_id: str, prefetch: int = PREFETCH_COUNT):
+    """
+    Get the wishlist data for the given profile name or id and the changes since the last request.
+
+    The details of the first games (prefetch) are looked up in the background, so they are ready when the client asks for them.
+    """
+    if not 0 <= prefetch <= 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Prefetch must be between 0 and 100")
+    try:
+        wishlist_changes = await service_manager.get_wishlist_changes(profile_name_or_id)
+    except Exception as e:  # noqa: BLE001
+        raise_steam_error(e)
+    if wishlist_changes is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Steam ID / Profile not found (your wishlist must be public)")
+    start_prefetch(profile_name_or_id, wishlist_changes["appids"][:prefetch])
+    return json_response(request, wishlist_changes)
+
+
+@app.get("/wishlist/summary")
+async def get_wishlist_summary(
+    request: Request,
+    profile_name_or_id: str,
+    max_price: float | None = None,
+    min_discount: int | None = None,
+    at_historical_low: bool | None = None,
+    max_key_price: float | None = None,
+    min_review_score: int | None = None,
+    max_main_hours: float | None = None,
+    min_linux_tier: str | None = None,
+    sort: str = "rank",
+    limit: int = 100
+):
+    """
+    Filter and sort the cached details of a wishlist.
+
+    Sort by comma separated columns, a leading "-" sorts descending. Games without cached details are listed as uncached.
+    """
+    if not 1 <= limit <= 10000:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Limit must be between 1 and 10000")
+    if min_linux_tier is not None:
+        min_linux_tier = min_linux_tier.upper()
+        if min_linux_tier not in LINUX_TIERS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Linux tier must be one of {', '.join(LINUX_TIERS)}")
+    sort_columns = [column.strip() for column in sort.split(",") if column.strip()]
+    for column in sort_columns:
+        if column.removeprefix("-") not in COLUMNS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown sort column: {column}")
+
+    # The wishlist of the last request, so the summary doesn't wait for steam
     try:
-        game_appids: list[int] | None = await service_manager.get_wishlist(profile_name_or_id)
+        appids = await service_manager.get_wishlist_snapshot(profile_name_or_id)
+        if appids is None:
+            wishlist_changes = await service_manager.get_wishlist_changes(profile_name_or_id)
+            appids = None if wishlist_changes is None else wishlist_changes["appids"]
     except Exception as e:  # noqa: BLE001
         raise_steam_error(e)
-    if game_appids is None:
+    if appids is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Steam ID / Profile not found (your wishlist must be public)")
-    return game_appids
+
+    records = await backend.get_many_details(appids)
+    start_time = time.perf_counter()
+    frame = wishlist_summary.build_frame(appids, records)
+    matches = wishlist_summary.sort(wishlist_summary.filter(frame, SummaryFilters(
+        max_price=max_price,
+        min_discount=min_discount,
+        at_historical_low=at_historical_low,
+        max_key_price=max_key_price,
+        min_review_score=min_review_score,
+        max_main_hours=max_main_hours,
+        min_linux_tier=min_linux_tier
+    )), sort_columns)
+    rows = wishlist_summary.to_rows(matches.head(limit))
+    logger.debug(f"Summarized {len(frame)} games in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+    return json_response(request, {
+        "columns": COLUMNS,
+        "rows": rows,
+        "match_count": len(matches),
+        "cached_count": len(records),
+        "uncached": [appid for appid in appids if appid not in records]
+    })
+
+
+@app.get("/search")
+async def search(request: Request, query: str, limit: int = 10):
+    """Get the apps with the most similar names for the typeahead."""
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Limit must be between 1 and 50")
+    try:
+        candidates = await service_manager.search_apps(query, limit)
+    except Exception as e:  # noqa: BLE001
+        raise_steam_error(e)
+    return json_response(request, [candidate._asdict() for candidate in candidates])
 
 
 @app.get("/details")
-async def details(appid_or_name: str, use_cache: bool = True):
-    """Get the details for the given appid or name."""
+async def details(request: Request, appid_or_name: str, use_cache: bool = True, budget_ms: int | None = None):
+    """
+    Get the details for the given appid or name.
+
+    If a budget is given, services that didn't finish in time are marked as pending.
+    They keep running in the background and write their results into the cache.
+    """
     if details_lock.locked():
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy")
 
@@ -97,9 +397,22 @@ async def details(appid_or_name: str, use_cache: bool = True):
         if appid_or_name.strip() == "":
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty search")
 
-        # Get steam details
+        if budget_ms is not None and budget_ms < 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Negative budget")
+        start_time = time.time()
+
+        def get_remaining_budget() -> float | None:
+            return None if budget_ms is None else max(budget_ms / 1000 - (time.time() - start_time), 0)
+
+        # Get steam details (the cache is checked first, so cached games don't wait for steam)
         steam: SteamDetails | None = None
         if appid_or_name.strip().isdigit():
+            record_client_activity(int(appid_or_name))
+            if use_cache:
+                await wait_for_prefetch(int(appid_or_name), get_remaining_budget())
+            cached_response = await get_cached_response(request, int(appid_or_name), use_cache)
+            if cached_response is not None:
+                return cached_response
             try:
                 steam = await service_manager.steam.create_task(appid=int(appid_or_name))
             except Exception as e:  # noqa: BLE001
@@ -111,6 +424,11 @@ async def details(appid_or_name: str, use_cache: bool = True):
                 raise_steam_error(e)
             if appid is None:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="App not found")
+            if use_cache:
+                await wait_for_prefetch(appid, get_remaining_budget())
+            cached_response = await get_cached_response(request, appid, use_cache)
+            if cached_response is not None:
+                return cached_response
             try:
                 steam = await service_manager.steam.create_task(appid=appid)
                 if steam is None:
@@ -118,133 +436,68 @@ async def details(appid_or_name: str, use_cache: bool = True):
             except Exception as e:  # noqa: BLE001
                 raise_steam_error(e)
 
-        # Cache
-        logger.debug(f"Checking cache for app {steam.appid}")
-        for cache_time, services in details_cache.copy().items():
-            # Remove old cache entries
-            if time.time() - cache_time > 60 * 15:
-                logger.debug(f"Removing old cache entry: {cache_time}")
-                del details_cache[cache_time]
-                continue
+        # Get the details of all services
+        cached_details, pending_tasks = await collect_details(steam, get_remaining_budget())
 
-            # Check if already in cache
-            if services["steam"]["data"]["appid"] == steam.appid:
-                if use_cache:
-                    logger.debug(f"Using cache for app {steam.appid}")
-                    return Details(
-                        services=services,
-                        from_cache=True
-                    )
-                else:
-                    logger.debug(f"Removing cache for app {steam.appid}")
-                    del details_cache[cache_time]
-        logger.debug(f"Cache check done for app {steam.appid}")
-
-        if steam.released:
-
-            services: dict[str, ServiceDetails | ServiceError] = {
-                "steam": {
-                    "success": True,
-                    "data": steam.model_dump()
-                }
-            }
-            task_services: dict[str, Service] = {}
-
-            # Steam historical low
-            if steam.price is None:
-                services["steam_historical_low"] = {
-                    "success": True,
-                    "data": None
-                }
-            elif steam.price > 0:
-                task_services["steam_historical_low"] = service_manager.steamdb
-            else:
-                services["steam_historical_low"] = {
-                    "success": True,
-                    "data": {
-                        "price": 0.0,
-                        "discount": 0,
-                        "iso_date": None,
-                        "external_url": None
-                    }
-                }
-
-            # Key and gift sellers
-            if steam.price is not None and steam.price > 0:
-                task_services["key_and_gift_sellers"] = service_manager.keyforsteam
-            else:
-                services["key_and_gift_sellers"] = {
-                    "success": True,
-                    "data": None
-                }
-
-            # Game length
-            task_services["game_length"] = service_manager.how_long_to_beat
-
-            # Linux support
-            if steam.native_linux_support:
-                services["linux_support"] = {
-                    "success": True,
-                    "data": None
-                }
-            else:
-                task_services["linux_support"] = service_manager.protondb
-
-            # Create JSON tasks
-            json_tasks: dict[str, asyncio.Task[ServiceDetails | ServiceError]] = {}
-            for name, service in task_services.items():
-                json_tasks[name] = get_json_from_task(service.create_task(steam=steam), service)
-
-            # Run tasks
-            results = await asyncio.gather(*json_tasks.values())
-            for task, result in zip(json_tasks.keys(), results, strict=True):
-                services[task] = result
-
-            details = Details(
-                services=services,
-                from_cache=False
-            )
-
-        else:
-
-            details = Details(
-                services={
-                    "steam": {
-                        "success": True,
-                        "data": steam.model_dump()
-                    },
-                    "steam_historical_low": {
-                        "success": True,
-                        "data": None
-                    },
-                    "key_and_gift_sellers": {
-                        "success": True,
-                        "data": None
-                    },
-                    "game_length": {
-                        "success": True,
-                        "data": None
-                    },
-                    "linux_support": {
-                        "success": True,
-                        "data": None
-                    }
-                },
-                from_cache=False
-            )
-
-        logger.info(f"Details: {details}")
+        logger.info(f"Details: {cached_details.services_json.decode()}")
 
         # Add to cache
-        details_cache[time.time()] = details.services
+        await store_details(steam.appid, cached_details)
+
+        # Complete pending tasks in the background
+        if pending_tasks:
+            start_background_task(complete_in_background(steam.appid, cached_details, pending_tasks))
+
+        return encoded_response(
+            request,
+            render_details(cached_details.services_json, cached_details.pending, from_cache=False),
+            "application/json",
+            REVALIDATE_CACHE_CONTROL
+        )
+
 
-        return details.model_dump()
+@app.get("/price_history")
+async def get_price_history(request: Request, appid: int):
+    """Get the prices observed by this server for the app and their lows."""
+    return json_response(request, {
+        "appid": appid,
+        "sources": {source: (await price_history.get(appid, source)).to_json() for source in SOURCES}
+    })
 
 
 @app.get("/analyze")
-async def analyze():
+async def analyze(request: Request):
     """Analyze all services and return their data."""
     data = await service_manager.analyze_services()
     if data is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No data available")
-    return data.model_dump()
+    return json_response(request, data.model_dump())
+
+
+@app.get("/trace/{trace_id}")
+async def get_trace(request: Request, trace_id: str):
+    """Get the spans of a recent request of this worker as a waterfall (the id is in the X-Trace-Id header of the response)."""
+    spans = tracer.get_trace(trace_id.lower())
+    if not spans:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    return json_response(request, get_waterfall(spans))
+
+
+@app.get("/profile")
+async def profile(seconds: float = 10):
+    """Profile everything the worker does for some seconds (like background refreshes and prefetches) and return the folded stacks."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling is disabled")
+    if not 0 < seconds <= MAX_DURATION:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Seconds must be between 0 and {MAX_DURATION}")
+    if profiling_lock.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Already profiling")
+
+    async with profiling_lock:
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)  # Joins the sampler thread
+    return profile_response(profiler)
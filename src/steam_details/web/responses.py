@@ -0,0 +1,156 @@
+import gzip
+import mimetypes
+import os
+from typing import Any
+
+import brotli
+import orjson
+from fastapi import Request, Response, status
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import Receive, Scope, Send
+
+from ..utils import make_digest
+
+MIN_COMPRESSION_SIZE = 512  # Smaller bodies are sent uncompressed
+
+COMPRESSIBLE_MEDIA_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def compress(body: bytes, encoding: str, *, best: bool = False) -> bytes:
+    """Compress the body with the given content encoding (best=True for bodies that are compressed only once)."""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else 5)
+    elif encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+    raise ValueError(f"Unknown encoding: {repr(encoding)}")
+
+
+def choose_encoding(request: Request, available: list[str]) -> str | None:
+    """Return the preferred content encoding accepted by the client or None for identity."""
+    accepted: set[str] = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    for encoding in available:  # Ordered by preference
+        if encoding in accepted:
+            return encoding
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check if the If-None-Match header matches the ETag (weak comparison, like RFC 9110 requires for If-None-Match)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    for other_etag in if_none_match.split(","):
+        other_etag = other_etag.strip()
+        if other_etag == "*" or other_etag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def encoded_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    cache_control: str,
+    *,
+    digest: str | None = None,
+    variants: dict[str, bytes] | None = None
+) -> Response:
+    """
+    Return a compressed response with a strong ETag or a 304 if the client already has it.
+
+    Pass precompressed variants (encoding -> body) to avoid compressing on every request.
+    """
+    if digest is None:
+        digest = make_digest(body)
+    headers = {
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding"
+    }
+
+    # Choose the representation first, a 304 has to carry the ETag of the representation the client would get
+    if variants is not None:
+        encoding = choose_encoding(request, list(variants.keys()))
+    elif len(body) >= MIN_COMPRESSION_SIZE and media_type.startswith(COMPRESSIBLE_MEDIA_TYPES):
+        encoding = choose_encoding(request, ["br", "gzip"])
+    else:
+        encoding = None
+    headers["ETag"] = f'"{digest}"' if encoding is None else f'"{digest}-{encoding}"'  # Strong ETags must differ for every content encoding
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding is not None:
+        body = variants[encoding] if variants is not None else compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def json_response(request: Request, content: Any) -> Response:
+    """Return the content as a compressed JSON response with a strong ETag."""
+    body = orjson.dumps(content)
+    return encoded_response(request, body, "application/json", REVALIDATE_CACHE_CONTROL)
+
+
+class StaticAsset:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.digest = make_digest(self.body)
+
+        # Precompress once
+        self.variants: dict[str, bytes] = {}
+        if len(self.body) >= MIN_COMPRESSION_SIZE and self.media_type.startswith(COMPRESSIBLE_MEDIA_TYPES):
+            for encoding in ("br", "gzip"):
+                self.variants[encoding] = compress(self.body, encoding, best=True)
+
+
+class StaticAssets:
+    """
+    Serve static files from memory with precompressed variants and fingerprinted URLs.
+
+    URLs created by `url` carry the fingerprint of the file and are cached forever by the browser.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._assets: dict[str, StaticAsset] = {}
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = os.path.join(root, file)
+                self._assets[os.path.relpath(path, directory).replace(os.sep, "/")] = StaticAsset(path)
+
+    def url(self, path: str) -> str:
+        """Return the fingerprinted URL for the given path."""
+        return f"/static/{path}?v={self._assets[path].digest[:12]}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: D102
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            raise StarletteHTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        asset = self._assets.get(scope["path"].removeprefix(scope.get("root_path", "")).lstrip("/"))
+        if asset is None:
+            raise StarletteHTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+        if request.query_params.get("v") == asset.digest[:12]:
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = REVALIDATE_CACHE_CONTROL
+
+        response = encoded_response(
+            request,
+            asset.body,
+            asset.media_type,
+            cache_control,
+            digest=asset.digest,
+            variants=asset.variants
+        )
+        await response(scope, receive, send)
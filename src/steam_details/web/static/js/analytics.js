@@ -108,6 +108,55 @@ async function analyze() {
 
             serviceElement.appendChild(serviceErrorCount);
 
+            // Upstream requests per lookup and the budget
+            const serviceRequests = document.createElement("div");
+
+            const serviceRequestsTitle = document.createElement("div");
+            serviceRequestsTitle.innerText = "Requests / Lookup";
+            serviceRequests.appendChild(serviceRequestsTitle);
+
+            const serviceRequestsValue = document.createElement("div");
+            serviceRequestsValue.innerText = `${service.requests_per_lookup ?? "-"} / ${service.request_budget ?? "∞"}`;
+            serviceRequestsValue.title = `Budget exhausted: ${service.budget_exhausted_count}`;
+            serviceRequestsValue.className = service.budget_exhausted_count > 0 ? "orange-text" : "green-text";
+            serviceRequests.appendChild(serviceRequestsValue);
+
+            serviceElement.appendChild(serviceRequests);
+
+            // Lookups per tier (only for services with tiers)
+            const tierEntries = Object.entries(service.tier_counts);
+            if (tierEntries.length > 0) {
+                const serviceTiers = document.createElement("div");
+
+                const serviceTiersTitle = document.createElement("div");
+                serviceTiersTitle.innerText = "Served By";
+                serviceTiers.appendChild(serviceTiersTitle);
+
+                const tierTotal = tierEntries.reduce((sum, [, count]) => sum + count, 0);
+                const serviceTiersValue = document.createElement("div");
+                serviceTiersValue.innerText = tierEntries.map(([tier, count]) => `${tier} ${Math.round(count / tierTotal * 100)}%`).join(" / ");
+                serviceTiersValue.title = tierEntries.map(([tier, count]) => `${tier}: ${count}`).join("\n");
+                serviceTiers.appendChild(serviceTiersValue);
+
+                serviceElement.appendChild(serviceTiers);
+            }
+
+            // Running and waiting calls
+            const serviceCalls = document.createElement("div");
+
+            const serviceCallsTitle = document.createElement("div");
+            serviceCallsTitle.innerText = "Running / Waiting";
+            serviceCalls.appendChild(serviceCallsTitle);
+
+            const waitingCount = Object.values(service.waiting).reduce((sum, count) => sum + count, 0);
+            const serviceCallsValue = document.createElement("div");
+            serviceCallsValue.innerText = `${service.running}/${service.max_concurrency} / ${waitingCount}`;
+            serviceCallsValue.title = Object.entries(service.waiting).map(([priority, count]) => `${priority}: ${count}`).join("\n");
+            serviceCallsValue.className = waitingCount > 0 ? "orange-text" : "green-text";
+            serviceCalls.appendChild(serviceCallsValue);
+
+            serviceElement.appendChild(serviceCalls);
+
             // Add to list
             serviceStats.appendChild(serviceElement);
         }
@@ -127,6 +176,40 @@ async function analyze() {
             noData.innerText = "No data for the speed box plot available. Search for some games first. The more games you search, the better the results will be.";
             elements.push(noData);
         }
+
+        // Display event loop lag and what blocked the loop
+        const loopLag = document.createElement("div");
+        loopLag.id = "loop-lag";
+        loopLag.className = "center-text";
+
+        const loopLagTitle = document.createElement("div");
+        loopLagTitle.innerText = "Event Loop Lag";
+        loopLagTitle.className = "title margin-top";
+        loopLag.appendChild(loopLagTitle);
+
+        const loopLagValue = document.createElement("div");
+        const lag = data.loop_lag;
+        loopLagValue.innerText = `p50 ${lag.p50_ms ?? "-"}ms / p99 ${lag.p99_ms ?? "-"}ms / max ${lag.max_ms ?? "-"}ms, blocked ${lag.blocked_count} times`;
+        loopLagValue.title = `Blocked means more than ${lag.threshold_ms}ms late`;
+        loopLagValue.className = lag.blocked_count > 0 ? "orange-text" : "green-text";
+        loopLag.appendChild(loopLagValue);
+
+        for (const block of lag.recent_blocks) {
+            const blockElement = document.createElement("details");
+
+            const blockSummary = document.createElement("summary");
+            const innermost = block.stack.length > 0 ? block.stack[block.stack.length - 1] : "unknown code";
+            blockSummary.innerText = `${new Date(block.time * 1000).toLocaleTimeString()}: ${block.duration_ms}ms in ${innermost}`;
+            blockElement.appendChild(blockSummary);
+
+            const blockStack = document.createElement("pre");
+            blockStack.innerText = block.stack.join("\n");
+            blockElement.appendChild(blockStack);
+
+            loopLag.appendChild(blockElement);
+        }
+
+        elements.push(loopLag);
     }
 
     // Clear content
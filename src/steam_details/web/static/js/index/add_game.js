@@ -31,7 +31,7 @@ function addGame(game, resultItem) {
 
     // Retry Button
     for (const service in game.services) {
-        if (!game.services[service].success) {
+        if (!game.services[service].success && !game.services[service].pending) {
             addRetryButton("Retry", game.services.steam.data.appid, resultItem);
             break;
         }
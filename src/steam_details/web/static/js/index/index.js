@@ -25,9 +25,45 @@ function createResultItem(appendToTop) {
 }
 
 
+const DETAILS_BUDGET_MS = 5000;
+
+
+let displayedWishlist = null;  // The profile and its result items (appid -> result item) to refresh incrementally
+
+let detailsQueue = Promise.resolve();  // The server answers one details request at a time and is busy for the others
+
+
+function getDetails(query) {
+    // Send the details requests of this page one after another, so polls don't collide with the searches
+    const request = detailsQueue.then(() => getRequest(`details?budget_ms=${DETAILS_BUDGET_MS}&${query}`));
+    detailsQueue = request.catch(() => {});
+    return request;
+}
+
+
+function pollPendingDetails(details, resultItem) {
+    if (details.pending.length === 0) {
+        return;
+    }
+
+    // Ask again for the cached details until all services finished in the background
+    setTimeout(async () => {
+        try {
+            details = await getDetails("appid_or_name=" + encodeURIComponent(details.services.steam.data.appid));
+            addGame(details, resultItem);
+        } catch (error) {  // The server might be busy, try again later
+            console.error(error);
+        }
+        pollPendingDetails(details, resultItem);
+    }, 2000);
+}
+
+
 async function fetchDetails(resultItem, appidOrName) {
     resultItem.innerText = `Getting details for '${appidOrName}'...`;
-    addGame(await getRequest("details?use_cache=false&appid_or_name=" + encodeURIComponent(appidOrName)), resultItem);
+    const details = await getDetails("use_cache=false&appid_or_name=" + encodeURIComponent(appidOrName));
+    addGame(details, resultItem);
+    pollPendingDetails(details, resultItem);
 }
 
 
@@ -47,7 +83,10 @@ async function search(mode, searchValue, progress) {
 
         // Get details
         progressText.innerText = `Getting details for '${appidOrName}'...`;
-        addGame(await getRequest("details?appid_or_name=" + encodeURIComponent(appidOrName)), createResultItem(true));
+        const details = await getDetails("appid_or_name=" + encodeURIComponent(appidOrName));
+        const resultItem = createResultItem(true);
+        addGame(details, resultItem);
+        pollPendingDetails(details, resultItem);
 
     } else if (mode === "wishlist") {
 
@@ -58,31 +97,70 @@ async function search(mode, searchValue, progress) {
             profile_name_or_id = searchValue;
         }
 
-        // Clear results
-        document.getElementById("result").innerHTML = "";
-
         // Get wishlist
         progressText.innerText = `Getting wishlist for '${profile_name_or_id}'...`;
-        const wishlist = await await getRequest("wishlist?profile_name_or_id=" + encodeURIComponent(profile_name_or_id));
+        const wishlist = await getRequest("wishlist?profile_name_or_id=" + encodeURIComponent(profile_name_or_id));
+
+        // Keep the games of a refreshed wishlist and remove the ones that are gone
+        let resultItems;
+        if (displayedWishlist !== null && displayedWishlist.profileNameOrId === profile_name_or_id) {
+            resultItems = displayedWishlist.resultItems;
+            const appids = new Set(wishlist.appids);
+            for (const [appid, resultItem] of resultItems) {
+                if (!appids.has(appid)) {
+                    resultItem.remove();
+                    resultItems.delete(appid);
+                }
+            }
+        } else {
+            document.getElementById("result").innerHTML = "";
+            resultItems = new Map();
+        }
+        displayedWishlist = {profileNameOrId: profile_name_or_id, resultItems: resultItems};
+        console.log(`Wishlist changes: ${wishlist.added.length} added, ${wishlist.removed.length} removed, ${wishlist.reprioritized.length} reprioritized`);
+
+        // Sort by priority and add placeholders for new games (or games that weren't loaded last time)
+        const newAppids = [];
+        const keptAppids = [];
+        for (const appid of wishlist.appids) {
+            let resultItem = resultItems.get(appid);
+            if (resultItem === undefined) {
+                resultItem = createResultItem(false);
+                resultItem.innerText = `Waiting for '${appid}'...`;
+                resultItems.set(appid, resultItem);
+            } else {
+                document.getElementById("result").appendChild(resultItem);
+            }
+            if (resultItem.dataset.loaded === "true") {
+                keptAppids.push(appid);
+            } else {
+                newAppids.push(appid);
+            }
+        }
 
         // Set progress bar to use percentage
         progress.value = 0;
         progress.max = 100;
 
-        // Add games
-        for (i = 0; i < wishlist.length; i++) {
-            const appid = wishlist[i];
+        // Add new games first, then update the displayed ones (their prices might have changed, the cache answers quickly)
+        const appidsToLoad = newAppids.concat(keptAppids);
+        for (i = 0; i < appidsToLoad.length; i++) {
+            const appid = appidsToLoad[i];
+            const kept = i >= newAppids.length;
 
             // Get details
-            progressText.innerText = `Getting details for '${appid}'...`;
-            const details = await getRequest("details?appid_or_name=" + encodeURIComponent(appid));
-            addGame(details, createResultItem(false));
+            progressText.innerText = kept ? `Updating details for '${appid}'...` : `Getting details for '${appid}'...`;
+            const details = await getDetails("appid_or_name=" + encodeURIComponent(appid));
+            const resultItem = resultItems.get(appid);
+            addGame(details, resultItem);
+            resultItem.dataset.loaded = "true";
+            pollPendingDetails(details, resultItem);
 
             // Update progress
-            progress.value = ((i + 1) / wishlist.length) * 100;
+            progress.value = ((i + 1) / appidsToLoad.length) * 100;
 
-            // Wait a bit
-            if (i < wishlist.length - 1) {
+            // Wait a bit (not for updates from the cache, they don't reach the upstreams)
+            if (i < appidsToLoad.length - 1 && !(kept && details.from_cache)) {
                 if (details.from_cache) {
 
                     progressText.innerText = `Waiting only 0.5 seconds due to cache...`;
@@ -109,6 +187,39 @@ async function search(mode, searchValue, progress) {
 }
 
 
+const SUGGESTION_DELAY_MS = 150;
+
+let suggestionTimeout = null;
+
+
+function updateSuggestions() {
+    // Suggest apps while typing a game name (the app id is used as value, so colliding names stay distinguishable)
+    clearTimeout(suggestionTimeout);
+    const query = document.getElementById("search-input").value.trim();
+    const suggestions = document.getElementById("search-suggestions");
+    if (document.getElementById("mode-select").value !== "single-game" || query.length < 2 || /^\d+$/.test(query) || query.startsWith("https://")) {
+        suggestions.innerHTML = "";
+        return;
+    }
+    suggestionTimeout = setTimeout(async () => {
+        let candidates;
+        try {
+            candidates = await getRequest("search?limit=10&query=" + encodeURIComponent(query));
+        } catch (error) {  // Suggestions are optional
+            console.error(error);
+            return;
+        }
+        suggestions.innerHTML = "";
+        for (const candidate of candidates) {
+            const option = document.createElement("option");
+            option.value = candidate.appid;
+            option.textContent = candidate.name;
+            suggestions.appendChild(option);
+        }
+    }, SUGGESTION_DELAY_MS);
+}
+
+
 document.addEventListener("DOMContentLoaded", function() {
     // Search
     document.getElementById("search-button").addEventListener("click", async function() {
@@ -160,6 +271,9 @@ document.addEventListener("DOMContentLoaded", function() {
         searchInput.focus();
     });
 
+    // Suggestions
+    document.getElementById("search-input").addEventListener("input", updateSuggestions);
+
     // Search with Enter
     document.getElementById("search-input").addEventListener("keydown", function(event) {
         if (event.key === "Enter") {
@@ -178,6 +292,7 @@ document.addEventListener("DOMContentLoaded", function() {
         }
         // Reset search bar
         searchInput.value = "";
+        updateSuggestions();
     });
     document.getElementById("mode-select").dispatchEvent(new Event("change"));
 });
@@ -1,24 +1,29 @@
 import os
 
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from ..loop_monitor import loop_monitor
 from ..service_manager import service_manager
+from ..utils import prewarm_connections
 from .api import app as api_app
+from .responses import StaticAssets
 
-app = FastAPI(openapi_url=None, on_startup=[service_manager.load_services])
+app = FastAPI(openapi_url=None, on_startup=[loop_monitor.start, prewarm_connections, service_manager.load_services])
 
 app.mount("/api", api_app)
 
-app.mount("/static", StaticFiles(
+static_assets = StaticAssets(
     directory=os.path.join(os.path.dirname(__file__), "static")
-), name="static")
+)
+
+app.mount("/static", static_assets, name="static")
 
 templates = Jinja2Templates(
     directory=os.path.join(os.path.dirname(__file__), "templates")
 )
+templates.env.globals["static_url"] = static_assets.url
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -0,0 +1,160 @@
+import sys
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from .backend import DetailsRecord
+
+LINUX_TIERS = ["BORKED", "BRONZE", "SILVER", "GOLD", "PLATINUM", "NATIVE"]  # Worst to best, NATIVE if steam lists linux support
+
+COLUMNS = [
+    "rank",  # Position in the wishlist
+    "appid",
+    "name",
+    "price",
+    "discount",
+    "historical_low",
+    "at_historical_low",
+    "key_price",
+    "review_score",
+    "main_hours",
+    "plus_hours",
+    "completionist_hours",
+    "linux_tier"
+]
+
+MAX_CACHED_ROWS = 50000  # Parsed details that are kept between summaries
+
+
+class SummaryFilters(NamedTuple):
+    max_price: float | None = None
+    min_discount: int | None = None
+    at_historical_low: bool | None = None
+    max_key_price: float | None = None
+    min_review_score: int | None = None
+    max_main_hours: float | None = None
+    min_linux_tier: str | None = None
+
+
+def _get_data(services: dict, name: str) -> dict | None:
+    service = services.get(name)
+    if service is None or not service["success"]:
+        return
+    return service["data"]
+
+
+def _hours(seconds: int | None) -> float | None:
+    return None if seconds is None else round(seconds / 3600, 2)
+
+
+def parse_row(appid: int, body: bytes) -> tuple:
+    """Extract the summary columns (without the rank) from the rendered details of a game."""
+    services = orjson.loads(body)["services"]
+    steam = _get_data(services, "steam") or {}
+    historical_low = _get_data(services, "steam_historical_low")
+    key_and_gift_sellers = _get_data(services, "key_and_gift_sellers")
+    game_length = _get_data(services, "game_length") or {}
+    linux_support = _get_data(services, "linux_support")
+
+    if steam.get("native_linux_support"):
+        linux_tier = "NATIVE"
+    elif linux_support is not None and linux_support["tier"] in LINUX_TIERS:
+        linux_tier = sys.intern(linux_support["tier"])  # Shared by all cached rows
+    else:
+        linux_tier = None
+
+    return (
+        appid,
+        steam.get("name"),
+        steam.get("price"),
+        steam.get("discount"),
+        None if historical_low is None else historical_low["price"],
+        None if key_and_gift_sellers is None else key_and_gift_sellers["cheapest_offer"]["price"],
+        (steam.get("overall_reviews") or {}).get("score"),
+        _hours(game_length.get("main")),
+        _hours(game_length.get("plus")),
+        _hours(game_length.get("completionist")),
+        linux_tier
+    )
+
+
+class WishlistSummary:
+    """Rank the cached details of a wishlist in a pandas frame with vectorized filters and sorts."""
+
+    def __init__(self) -> None:
+        self._rows: dict[int, tuple[str, tuple]] = {}  # App id -> (digest, row), so unchanged details aren't parsed again
+
+    def _get_row(self, appid: int, record: DetailsRecord) -> tuple:
+        cached = self._rows.get(appid)
+        if cached is not None and cached[0] == record.digest:
+            return cached[1]
+        row = parse_row(appid, record.body)
+        if len(self._rows) >= MAX_CACHED_ROWS:
+            self._rows.clear()
+        self._rows[appid] = (record.digest, row)
+        return row
+
+    def build_frame(self, appids: list[int], records: dict[int, DetailsRecord]) -> pd.DataFrame:
+        """Return a frame with a row per cached game, in wishlist order."""
+        ranks = [rank for rank, appid in enumerate(appids, start=1) if appid in records]
+        rows = [self._get_row(appid, records[appid]) for appid in appids if appid in records]
+        frame = pd.DataFrame.from_records(
+            rows,
+            columns=[column for column in COLUMNS if column not in ("rank", "at_historical_low")]
+        )
+        frame.insert(0, "rank", np.array(ranks, dtype=np.int64))
+        for column in ("price", "historical_low", "key_price", "main_hours", "plus_hours", "completionist_hours"):
+            frame[column] = frame[column].astype("float64")
+        for column in ("discount", "review_score"):
+            frame[column] = frame[column].astype("Int64")
+        frame["linux_tier"] = pd.Categorical(frame["linux_tier"], categories=LINUX_TIERS, ordered=True)
+
+        # The price can't be lower than the historical low, a small difference is rounding (unknown without both)
+        at_historical_low = (frame["price"] <= frame["historical_low"] + 0.005).astype("boolean")
+        at_historical_low[frame["price"].isna() | frame["historical_low"].isna()] = pd.NA
+        frame.insert(COLUMNS.index("at_historical_low"), "at_historical_low", at_historical_low)
+        return frame
+
+    @staticmethod
+    def filter(frame: pd.DataFrame, filters: SummaryFilters) -> pd.DataFrame:
+        """Return the rows matching all filters (rows without a value don't match a filter on it)."""
+        mask = np.ones(len(frame), dtype=bool)
+        if filters.max_price is not None:
+            mask &= (frame["price"] <= filters.max_price).to_numpy()
+        if filters.min_discount is not None:
+            mask &= (frame["discount"] >= filters.min_discount).fillna(False).to_numpy(dtype=bool)
+        if filters.at_historical_low is not None:
+            mask &= (frame["at_historical_low"] == filters.at_historical_low).fillna(False).to_numpy(dtype=bool)
+        if filters.max_key_price is not None:
+            mask &= (frame["key_price"] <= filters.max_key_price).to_numpy()
+        if filters.min_review_score is not None:
+            mask &= (frame["review_score"] >= filters.min_review_score).fillna(False).to_numpy(dtype=bool)
+        if filters.max_main_hours is not None:
+            mask &= (frame["main_hours"] <= filters.max_main_hours).to_numpy()
+        if filters.min_linux_tier is not None:
+            mask &= (frame["linux_tier"] >= filters.min_linux_tier).to_numpy()
+        return frame[mask]
+
+    @staticmethod
+    def sort(frame: pd.DataFrame, sort: list[str]) -> pd.DataFrame:
+        """Sort by the columns (descending with a leading "-"), missing values last and the wishlist rank last."""
+        columns = [column.removeprefix("-") for column in sort]
+        ascending = [not column.startswith("-") for column in sort]
+        if "rank" not in columns:
+            columns.append("rank")
+            ascending.append(True)
+        return frame.sort_values(columns, ascending=ascending, na_position="last", kind="stable")
+
+    @staticmethod
+    def to_rows(frame: pd.DataFrame) -> list[list]:
+        """Return the rows as JSON compatible lists (missing values are None)."""
+        columns = []
+        for column in COLUMNS:
+            values = frame[column].astype(object)
+            columns.append(values.where(frame[column].notna(), None).tolist())
+        return [list(row) for row in zip(*columns, strict=True)]
+
+
+wishlist_summary = WishlistSummary()